@@ -1,16 +1,196 @@
-# This is a sample Python script.
+import argparse
+import statistics
+import sys
+import time
+from contextlib import closing
+from dataclasses import fields
+from pathlib import Path
 
-# Press ⌃R to execute it or replace it with your code.
-# Press Double ⇧ to search everywhere for classes, files, tool windows, actions, and settings.
+import pandas as pd
 
+from service import timing, warehouse
+from service.aggregation import aggregate
+from service.cache import PARSERS
+from service.dataset import DATASET_DIR, find_pdfs, ingest_files, read_dataset, replay_reports
+from service.ingestion import process_pdf
+from service.logs import configure_logging
+from service.pages import PAGE_CACHE_PATH
+from service.schema import concat_frames
 
-def print_hi(name):
-    # Use a breakpoint in the code line below to debug your script.
-    print(f'Hi, {name}')  # Press ⌘F8 to toggle the breakpoint.
 
+def ingest(args):
+    """
+    Parse every matching PDF into the partitioned Parquet dataset and the SQLite warehouse.
+    """
+    paths = find_pdfs(args.pdfs)
+    if not paths:
+        print("No PDF files found", file=sys.stderr)
+        return 1
 
-# Press the green button in the gutter to run the script.
-if __name__ == '__main__':
-    print_hi('PyCharm')
+    start = time.perf_counter()
+    total_rows, failed = 0, 0
+    results = ingest_files(
+        paths, args.dataset, args.workers, args.parser, use_cache=not args.no_cache,
+        warehouse_path=None if args.no_warehouse else args.warehouse, dedupe=args.dedupe,
+    )
+    for done, (path, rows, error) in enumerate(results, start=1):
+        if error:
+            failed += 1
+            print(f"[{done}/{len(paths)}] {path}: FAILED ({error})")
+        else:
+            total_rows += rows
+            print(f"[{done}/{len(paths)}] {path}: {rows} rows")
 
-# See PyCharm help at https://www.jetbrains.com/help/pycharm/
+    elapsed = time.perf_counter() - start
+    print(f"Ingested {total_rows} rows from {len(paths) - failed} of {len(paths)} PDFs into {args.dataset} in {elapsed:.1f}s")
+    return 1 if failed else 0
+
+
+def replay(args):
+    """
+    Re-parse historical reports from their cached text with the current parser, without their PDFs.
+    """
+    start = time.perf_counter()
+    total_rows, done, failed = 0, 0, 0
+    results = replay_reports(
+        args.dataset, args.workers, warehouse_path=args.warehouse, update_warehouse=not args.no_warehouse,
+        page_cache_path=args.page_cache, everything=args.all,
+    )
+    for done, (name, rows, error) in enumerate(results, start=1):
+        if error:
+            failed += 1
+            print(f"[{done}] {name}: FAILED ({error})")
+        else:
+            total_rows += rows
+            print(f"[{done}] {name}: {rows} rows")
+
+    if not done:
+        print("No reports to replay")
+        return 0
+    elapsed = time.perf_counter() - start
+    print(f"Replayed {total_rows} rows from {done - failed} of {done} reports in {elapsed:.1f}s")
+    return 1 if failed else 0
+
+
+def report(args):
+    """
+    Print the dashboard aggregates for the dataset, optionally writing each one to CSV.
+    """
+    if args.from_warehouse:
+        processed_df = load_warehouse_months(args.warehouse, args.month)
+    else:
+        processed_df = read_dataset(args.dataset, args.month)
+    if processed_df.empty:
+        print("No rows in the dataset for the selected months", file=sys.stderr)
+        return 1
+
+    aggregates = aggregate(processed_df)
+    with pd.option_context("display.width", 120, "display.max_columns", None):
+        print(f"{len(processed_df)} rows\n")
+        print(aggregates.categories.sort_values("Total_Cost", ascending=False).to_string(index=False), "\n")
+        print(aggregates.crafters.head(args.top).to_string(index=False), "\n")
+        print(aggregates.items.nlargest(args.top, "Total_Cost").to_string(index=False))
+
+    if args.out:
+        args.out.mkdir(parents=True, exist_ok=True)
+        for field in fields(aggregates):
+            getattr(aggregates, field.name).to_csv(args.out / f"{field.name}.csv", index=False)
+        print(f"\nWrote aggregates to {args.out}")
+    return 0
+
+
+def load_warehouse_months(path, months=None):
+    """
+    Load sales from the warehouse, only those sold in the given YYYY-MM months when given.
+    """
+    with closing(warehouse.connect(path)) as conn:
+        if not months:
+            return warehouse.load_sales(conn)
+        # Each month is a range scan on the sale date index
+        frames = []
+        for month in months:
+            period = pd.Period(month, freq="M")
+            frames.append(warehouse.load_sales(conn, start=period.start_time, end=period.end_time))
+    return concat_frames(frames)
+
+
+def bench(args):
+    """
+    Time uncached ingestion of each PDF, per pipeline stage, over several runs.
+    """
+    paths = find_pdfs(args.pdfs)
+    if not paths:
+        print("No PDF files found", file=sys.stderr)
+        return 1
+
+    for path in paths:
+        timing.collect()
+        for _ in range(args.repeat):
+            process_pdf(path, workers=args.workers, use_cache=False, parser=args.parser)
+        spans = timing.collect()
+        timing.write_log(spans, file_name=path.name, file_size=path.stat().st_size, command="bench")
+
+        stages = pd.DataFrame(spans).groupby("stage", sort=False).agg(
+            runs=("wall_ms", "size"),
+            wall_ms=("wall_ms", statistics.median),
+            cpu_ms=("cpu_ms", statistics.median),
+            rows=("rows", "max"),
+        )
+        print(f"{path} (median of {args.repeat} runs)")
+        print(stages.to_string(), "\n")
+    return 0
+
+
+def main(argv=None):
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Batch processing of Brooklyn Women's Exchange sales reports.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = commands.add_parser("ingest", help="Parse PDFs into the Parquet dataset and the warehouse.")
+    ingest_parser.add_argument("pdfs", nargs="+", help="PDF files, directories or glob patterns")
+    ingest_parser.add_argument("--dataset", default=DATASET_DIR, type=Path, help="Dataset directory (default: %(default)s)")
+    ingest_parser.add_argument("--workers", type=int, help="Reports processed in parallel (default: CPU count)")
+    ingest_parser.add_argument("--parser", choices=PARSERS, default="text")
+    ingest_parser.add_argument("--no-cache", action="store_true", help="Ignore the parsed PDF cache")
+    ingest_parser.add_argument("--warehouse", default=warehouse.WAREHOUSE_PATH, type=Path, help="SQLite warehouse (default: %(default)s)")
+    ingest_parser.add_argument("--no-warehouse", action="store_true", help="Only write the Parquet dataset")
+    ingest_parser.add_argument(
+        "--dedupe", action="store_true", help="Only store sales not already in the warehouse (for overlapping reports)"
+    )
+    ingest_parser.set_defaults(handler=ingest)
+
+    replay_parser = commands.add_parser("replay", help="Re-parse reports from their cached text with the current parser.")
+    replay_parser.add_argument("--all", action="store_true", help="Also replay reports already parsed with the current parser")
+    replay_parser.add_argument("--dataset", default=DATASET_DIR, type=Path, help="Dataset directory (default: %(default)s)")
+    replay_parser.add_argument("--workers", type=int, help="Reports parsed in parallel (default: CPU count)")
+    replay_parser.add_argument("--page-cache", default=PAGE_CACHE_PATH, type=Path, help="Cached text layer (default: %(default)s)")
+    replay_parser.add_argument("--warehouse", default=warehouse.WAREHOUSE_PATH, type=Path, help="SQLite warehouse (default: %(default)s)")
+    replay_parser.add_argument(
+        "--no-warehouse", action="store_true", help="Leave the warehouse as is (reports it stored with --dedupe are skipped)"
+    )
+    replay_parser.set_defaults(handler=replay)
+
+    report_parser = commands.add_parser("report", help="Summarize the dataset.")
+    report_parser.add_argument("--dataset", default=DATASET_DIR, type=Path, help="Dataset directory (default: %(default)s)")
+    report_parser.add_argument("--from-warehouse", action="store_true", help="Read the SQLite warehouse instead of the dataset")
+    report_parser.add_argument("--warehouse", default=warehouse.WAREHOUSE_PATH, type=Path, help="SQLite warehouse (default: %(default)s)")
+    report_parser.add_argument("--month", action="append", help="Only include this YYYY-MM month (repeatable)")
+    report_parser.add_argument("--top", type=int, default=10, help="Crafters and items to list")
+    report_parser.add_argument("--out", type=Path, help="Directory to write the aggregates to as CSV")
+    report_parser.set_defaults(handler=report)
+
+    bench_parser = commands.add_parser("bench", help="Time ingestion stages without the parse cache.")
+    bench_parser.add_argument("pdfs", nargs="+", help="PDF files, directories or glob patterns")
+    bench_parser.add_argument("--repeat", type=int, default=3)
+    bench_parser.add_argument("--workers", type=int, help="Processes used within a report (default: CPU count)")
+    bench_parser.add_argument("--parser", choices=PARSERS, default="text")
+    bench_parser.set_defaults(handler=bench)
+
+    args = parser.parse_args(argv)
+    if getattr(args, "dedupe", False) and args.no_warehouse:
+        parser.error("--dedupe needs the warehouse")
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from service import timing
+from service.categories import categorize_accounts
+
+
+@dataclass(frozen=True)
+class Aggregates:
+    """
+    Every aggregate the dashboard charts need, in dollars.
+    """
+
+    accounts: pd.DataFrame  # Account Number, Category, Total_Cost
+    categories: pd.DataFrame  # Category, Total_Cost
+    items: pd.DataFrame  # Item Number, Total_Cost, Count, Item_Name
+    days: pd.DataFrame  # Date Sold, Price
+    crafters: pd.DataFrame  # Crafter Name, Total_Sales, Quantity_Sold, Avg_Price (by Total_Sales, descending)
+
+
+def aggregate(processed_df):
+    """
+    Return the dashboard aggregates for typed processed rows.
+
+    Nothing is cached here; the app caches the bundle per source key (see
+    `load_aggregates` in streamlit_app.py).
+    """
+    with timing.span("Aggregation", rows=len(processed_df)):
+        return _aggregate(processed_df)
+
+
+def _aggregate(processed_df):
+    # **Step 1: Per-row measures, computed once**
+    # Prices stay in cents until the final rollups, missing prices count as 0 in sums.
+    price_cents = processed_df["Price Cents"]
+    priced = price_cents.notna().to_numpy()
+    cents = price_cents.to_numpy(dtype="float64", na_value=0.0)
+    item_name_codes = processed_df["Item Name"].cat.codes.to_numpy()
+    named = item_name_codes >= 0
+
+    # **Step 2: One bincount pass per dimension over its group codes**
+    account_codes, account_numbers = pd.factorize(processed_df["Account Number"], sort=True)
+    totals = _group_totals(account_codes, len(account_numbers), Cents=cents)
+    accounts = pd.DataFrame({"Account Number": account_numbers, "Total_Cost": totals["Cents"] / 100})
+    accounts.insert(1, "Category", categorize_accounts(account_numbers))
+
+    categories = accounts.groupby("Category", observed=True)["Total_Cost"].sum().reset_index()
+
+    item_numbers = processed_df["Item Number"]
+    item_codes = item_numbers.cat.codes.to_numpy()
+    item_count = len(item_numbers.cat.categories)
+    totals = _group_totals(item_codes, item_count, Cents=cents, Count=named, Rows=None)
+    first_names = _first_codes(item_codes, item_name_codes, item_count)
+    items = pd.DataFrame({
+        "Item Number": pd.Categorical.from_codes(np.arange(item_count), dtype=item_numbers.dtype),
+        "Total_Cost": totals["Cents"] / 100,
+        "Count": totals["Count"],
+        "Item_Name": pd.Categorical.from_codes(first_names, dtype=processed_df["Item Name"].dtype),
+    })[totals["Rows"] > 0].reset_index(drop=True)
+
+    day_codes, days_sold = pd.factorize(processed_df["Date Sold"], sort=True)  # NaT is left out
+    totals = _group_totals(day_codes, len(days_sold), Cents=cents)
+    days = pd.DataFrame({"Date Sold": days_sold, "Price": totals["Cents"] / 100})
+
+    crafter_names = processed_df["Crafter Name"]
+    crafter_count = len(crafter_names.cat.categories)
+    totals = _group_totals(
+        crafter_names.cat.codes.to_numpy(), crafter_count, Cents=cents, Count=named, Priced=priced, Rows=None,
+    )
+    crafters = pd.DataFrame({
+        "Crafter Name": pd.Categorical.from_codes(np.arange(crafter_count), dtype=crafter_names.dtype),
+        "Total_Sales": totals["Cents"] / 100,
+        "Quantity_Sold": totals["Count"],
+        "Avg_Price": totals["Cents"] / np.where(totals["Priced"] > 0, totals["Priced"], np.nan) / 100,
+    })[totals["Rows"] > 0].sort_values("Total_Sales", ascending=False).reset_index(drop=True)
+
+    return Aggregates(accounts, categories, items, days, crafters)
+
+
+def _group_totals(codes, size, **measures):
+    """
+    Per-group totals of each measure: weights are summed, boolean masks are
+    counted and None counts rows. Code -1 marks a missing key, such rows
+    belong to no group.
+    """
+    keep = codes >= 0
+    if keep.all():
+        keep = slice(None)  # Skip the masked copies in the common case
+    codes = codes[keep]
+
+    totals = {}
+    for name, values in measures.items():
+        if values is None:
+            totals[name] = np.bincount(codes, minlength=size)
+        elif values.dtype == bool:
+            totals[name] = np.bincount(codes[values[keep]], minlength=size)
+        else:
+            totals[name] = np.bincount(codes, weights=values[keep], minlength=size)
+    return totals
+
+
+def _first_codes(group_codes, value_codes, size):
+    # First non-missing value code per group, in row order; -1 (missing) for groups without one
+    keep = (group_codes >= 0) & (value_codes >= 0)
+    group_codes, value_codes = group_codes[keep], value_codes[keep]
+    unique_groups, first_rows = np.unique(group_codes, return_index=True)
+    first = np.full(size, -1, dtype=value_codes.dtype)
+    first[unique_groups] = value_codes[first_rows]
+    return first
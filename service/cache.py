@@ -0,0 +1,148 @@
+import argparse
+import hashlib
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+from service.logs import configure_logging
+from service.parsing import PARSER_VERSION
+
+CACHE_DIR = Path(os.environ.get("BWE_CACHE_DIR", ".cache/parsed"))
+CACHE_MAX_BYTES = int(os.environ.get("BWE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+DIGEST_CHUNK_BYTES = 1024 * 1024  # PDFs read from disk are hashed a chunk at a time
+PARSERS = ("text", "layout")
+
+logger = logging.getLogger(__name__)
+
+
+def source_digest(source):
+    """
+    SHA-256 hex digest of a PDF's bytes. `source` is the PDF's bytes (or a
+    memoryview over them) or its path.
+    """
+    if isinstance(source, (str, Path)):
+        digest = hashlib.sha256()
+        with open(source, "rb") as pdf_file:
+            for chunk in iter(lambda: pdf_file.read(DIGEST_CHUNK_BYTES), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    return hashlib.sha256(source).hexdigest()
+
+
+def report_key(digest, parser="text", version=PARSER_VERSION):
+    """
+    Content address of a parsed PDF, from its `source_digest` plus the parser and
+    its version. Derived from the digest alone, so results of another parser
+    version can be addressed without the PDF.
+    """
+    return hashlib.sha256(f"{digest}|{parser}-v{version}".encode()).hexdigest()
+
+
+def report_keys(digest):
+    """
+    Every `report_key` a PDF's results may be stored under: one per parser and
+    parser version, so callers can find the results of older versions.
+    """
+    return [report_key(digest, parser, version) for parser in PARSERS for version in range(1, PARSER_VERSION + 1)]
+
+
+def cache_key(source, parser="text"):
+    """
+    Content address of a parsed PDF (see `report_key`), from its bytes or path.
+    """
+    return report_key(source_digest(source), parser)
+
+
+def load(key, cache_dir=CACHE_DIR):
+    """
+    Return the cached DataFrame for `key`, or None on a miss.
+    """
+    path = Path(cache_dir) / f"{key}.parquet"
+    if not path.exists():
+        return None
+
+    try:
+        df = pd.read_parquet(path)
+        os.utime(path)  # Mark as recently used for LRU eviction
+        return df
+    except Exception as e:
+        logger.warning("Discarding unreadable cache entry %s: %s", path.name, e)
+        path.unlink(missing_ok=True)
+        return None
+
+
+def store(key, df, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """
+    Write `df` to the cache under `key`, then evict least recently used entries
+    until the cache fits in `max_bytes`.
+    """
+    cache_dir = Path(cache_dir)
+    tmp_path = None
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        # A temporary file of its own, so concurrent writers of the same key do not clobber each other's
+        with tempfile.NamedTemporaryFile(dir=cache_dir, prefix=f"{key}.", suffix=".tmp", delete=False) as tmp_file:
+            tmp_path = tmp_file.name
+            df.to_parquet(tmp_file, index=False)
+        os.replace(tmp_path, cache_dir / f"{key}.parquet")  # Readers never see a partial file
+    except Exception as e:
+        logger.warning("Could not cache parsed PDF: %s", e)
+        if tmp_path is not None:
+            Path(tmp_path).unlink(missing_ok=True)
+        return
+
+    evict(cache_dir, max_bytes)
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """
+    Delete least recently used entries until the cache fits in `max_bytes`.
+    """
+    entries = sorted(Path(cache_dir).glob("*.parquet"), key=lambda path: path.stat().st_mtime)
+    total = sum(path.stat().st_size for path in entries)
+
+    for path in entries:
+        if total <= max_bytes:
+            break
+        total -= path.stat().st_size
+        path.unlink(missing_ok=True)
+
+
+def invalidate(key=None, cache_dir=CACHE_DIR):
+    """
+    Remove the entry for `key`, or every entry when no key is given.
+    Returns the number of files removed.
+    """
+    pattern = f"{key}.parquet" if key else "*.parquet"
+    removed = 0
+    for path in Path(cache_dir).glob(pattern):
+        path.unlink(missing_ok=True)
+        removed += 1
+    return removed
+
+
+def main(argv=None):
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Manage the parsed PDF cache.")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, type=Path)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    invalidate_parser = commands.add_parser("invalidate", help="Drop cached results for PDFs, or everything.")
+    invalidate_parser.add_argument("pdfs", nargs="*", type=Path, help="PDF files to drop (default: all entries)")
+
+    args = parser.parse_args(argv)
+
+    if args.pdfs:
+        removed = sum(
+            invalidate(cache_key(pdf, variant), args.cache_dir) for pdf in args.pdfs for variant in PARSERS
+        )
+    else:
+        removed = invalidate(cache_dir=args.cache_dir)
+    print(f"Removed {removed} cache entr{'y' if removed == 1 else 'ies'} from {args.cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import functools
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Account number bands per category; point this at a copy to change the bands
+CATEGORY_CONFIG = os.environ.get("BWE_ACCOUNT_CATEGORIES", Path(__file__).with_name("account_categories.json"))
+
+
+class CategoryTable:
+    """
+    Sorted, non-overlapping account number bands `[start, stop)` with their
+    category. Numbers outside every band fall into the `unknown` category.
+    """
+
+    def __init__(self, bands, unknown="Unknown"):
+        bands = sorted(bands, key=lambda band: band["start"])
+        self.starts = np.array([band["start"] for band in bands], dtype="int64")
+        self.stops = np.array([band.get("stop", np.iinfo("int64").max) for band in bands], dtype="int64")
+        self.unknown = unknown
+
+        if (self.stops <= self.starts).any() or (self.starts[1:] < self.stops[:-1]).any():
+            raise ValueError("Account category bands must be non-empty and must not overlap")
+
+        # Sorted categories keep chart legends and groupbys in a stable, alphabetical order
+        labels = [band["category"] for band in bands]
+        self.categories = sorted(set(labels) | {unknown})
+        position = {category: code for code, category in enumerate(self.categories)}
+        # The extra last entry is the code for numbers outside every band
+        self.codes = np.array([position[label] for label in labels] + [position[unknown]], dtype="int16")
+
+    def categorize(self, account_numbers):
+        """
+        Return the category of each account number as a `pd.Categorical`.
+        Values that are not integer account numbers are categorized as unknown.
+        """
+        numbers = pd.to_numeric(pd.Series(account_numbers, copy=False), errors="coerce").to_numpy(
+            dtype="float64", na_value=np.nan
+        )
+        valid = np.isfinite(numbers) & (numbers == np.floor(numbers))
+        numbers = np.where(valid, numbers, -1).astype("int64")
+
+        band = np.searchsorted(self.starts, numbers, side="right") - 1
+        inside = valid & (band >= 0) & (numbers < self.stops[band.clip(0)])
+        codes = self.codes[np.where(inside, band, -1)]
+        return pd.Categorical.from_codes(codes, categories=self.categories)
+
+
+@functools.lru_cache(maxsize=None)
+def load_category_table(path=CATEGORY_CONFIG):
+    """
+    Load the account category bands from a JSON config file, once per path.
+    """
+    with open(path, encoding="utf-8") as config_file:
+        config = json.load(config_file)
+    return CategoryTable(config["bands"], config.get("unknown", "Unknown"))
+
+
+def categorize_accounts(account_numbers, table=None):
+    """
+    Categorize account numbers in one vectorized call, using the configured bands by default.
+    """
+    return (table or load_category_table()).categorize(account_numbers)
@@ -0,0 +1,235 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack, closing
+from glob import glob
+from pathlib import Path
+
+import pandas as pd
+
+from service import cache, warehouse
+from service.ingestion import process_pdf, replay_text
+from service.pages import PAGE_CACHE_PATH, PageCache
+from service.pools import pool_context
+from service.parsing import PARSER_VERSION
+from service.schema import CATEGORICAL_COLUMNS, COLUMNS, SCHEMA
+
+DATASET_DIR = Path(os.environ.get("BWE_DATASET_DIR", "data/sales"))
+PARTITION_COLUMN = "Sale Month"  # YYYY-MM of the sale, "unknown" when the date did not parse
+
+logger = logging.getLogger(__name__)
+
+
+def find_pdfs(patterns):
+    """
+    Expand directories (searched recursively), glob patterns and plain paths
+    into a sorted list of PDF paths without duplicates.
+    """
+    paths = set()
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            paths.update(path.rglob("*.pdf"))
+        elif path.exists():
+            paths.add(path)
+        else:
+            matches = glob(pattern, recursive=True)
+            if not matches:
+                logger.warning("No files match %s", pattern)
+            paths.update(Path(match) for match in matches)
+    return sorted(path for path in paths if path.suffix.lower() == ".pdf")
+
+
+def write_partitions(df, name, dataset_dir=DATASET_DIR):
+    """
+    Write processed rows to the Parquet dataset, partitioned by sale month.
+
+    Files are named after `name` (the report's content key), so ingesting the
+    same report again replaces its files instead of duplicating its rows;
+    `ingest_files` also removes those written under its keys for other parsers
+    and parser versions.
+    """
+    remove_partitions(name, dataset_dir)
+
+    months = df["Date Sold"].dt.strftime("%Y-%m").fillna("unknown")
+    df.assign(**{PARTITION_COLUMN: months}).to_parquet(
+        dataset_dir,
+        partition_cols=[PARTITION_COLUMN],
+        index=False,
+        basename_template=f"{name}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+
+def remove_partitions(name, dataset_dir=DATASET_DIR):
+    """
+    Delete the dataset files written under `name`, returning how many there were.
+    """
+    stale = list(Path(dataset_dir).glob(f"{PARTITION_COLUMN}=*/{name}-*.parquet"))
+    for path in stale:
+        path.unlink()
+    return len(stale)
+
+
+def read_dataset(dataset_dir=DATASET_DIR, months=None):
+    """
+    Read the processed rows of the dataset (optionally only the given "YYYY-MM"
+    months) back into the canonical typed schema.
+    """
+    filters = [(PARTITION_COLUMN, "in", list(months))] if months else None
+    df = pd.read_parquet(dataset_dir, filters=filters)[COLUMNS]
+
+    for column, dtype in SCHEMA.items():
+        if column not in CATEGORICAL_COLUMNS and df[column].dtype != dtype:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def ingest_files(
+    paths, dataset_dir=DATASET_DIR, workers=None, parser="text", use_cache=True,
+    warehouse_path=warehouse.WAREHOUSE_PATH, dedupe=False,
+):
+    """
+    Process PDFs and write them to the dataset, and to the SQLite warehouse unless
+    `warehouse_path` is None, one report per pool worker.
+
+    With `dedupe` (which needs the warehouse), sales already in the warehouse from
+    overlapping reports are skipped and only new rows are written.
+
+    Yields `(path, rows, error)` as each report finishes, with the number of rows
+    written; failures are reported rather than raised so one bad report does not
+    stop a backfill.
+    """
+    if dedupe and warehouse_path is None:
+        raise ValueError("Row-level dedupe needs the warehouse's sale hash index")
+
+    workers = workers or os.cpu_count() or 1
+    tasks = [(path, dataset_dir, parser, use_cache, warehouse_path, dedupe) for path in paths]
+
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield _ingest_file(task)
+        return
+
+    # Each worker handles a whole report, so reports are parsed serially inside it
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=pool_context()) as pool:
+        for future in as_completed([pool.submit(_ingest_file, task) for task in tasks]):
+            yield future.result()
+
+
+def _ingest_file(task):
+    path, dataset_dir, parser, use_cache, warehouse_path, dedupe = task
+    try:
+        df = process_pdf(path, workers=1, use_cache=use_cache, parser=parser)
+        key = df.attrs["source_key"]
+        # Results stored under another parser or parser version are replaced, not added to
+        stale_keys = [stale for stale in cache.report_keys(df.attrs["source_digest"]) if stale != key]
+        for stale in stale_keys:
+            remove_partitions(stale[:16], dataset_dir)
+        if warehouse_path is not None:
+            with closing(warehouse.connect(warehouse_path)) as conn:
+                stored = warehouse.store_report(conn, key, df, Path(path).name, dedupe=dedupe, replaces=stale_keys)
+            if dedupe:
+                if stored.empty:
+                    return path, 0, None  # Already ingested, or nothing new
+                df = stored
+        write_partitions(df, key[:16], dataset_dir)
+        return path, len(df), None
+    except Exception as e:
+        logger.error("Could not ingest %s: %s", path, e)
+        return path, 0, str(e)
+
+
+def replay_reports(
+    dataset_dir=DATASET_DIR, workers=None, warehouse_path=warehouse.WAREHOUSE_PATH, update_warehouse=True,
+    page_cache_path=PAGE_CACHE_PATH, everything=False,
+):
+    """
+    Re-parse historical reports from their cached text layer with the current
+    parser, without opening their PDFs: those parsed with another parser
+    version, or all of them with `everything`.
+
+    Reports are parsed in parallel, then their results replace the old ones, in
+    the order the reports were first stored: in the parsed PDF cache, in the
+    warehouse (unless `update_warehouse` is false) and in the dataset, wherever
+    the report was stored before. Reports the warehouse stored with dedupe are
+    deduped again, so they cannot be replayed without updating the warehouse.
+    With no `warehouse_path`, reports are written to the dataset in full.
+
+    Yields `(file_name, rows, error)` as each report finishes.
+    """
+    with closing(PageCache(page_cache_path)) as page_cache:
+        reports = page_cache.manifests(stale_for=None if everything else PARSER_VERSION)
+    if not reports:
+        return
+
+    workers = min(workers or os.cpu_count() or 1, len(reports))
+    tasks = [(digest, page_cache_path) for digest, _, _ in reports]
+    stores = (dataset_dir, warehouse_path, update_warehouse, page_cache_path)
+
+    if workers <= 1:
+        yield from _store_replays(reports, map(_replay_report, tasks), *stores)
+        return
+
+    # Each worker parses a whole report; `map` keeps the results in report order
+    with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context()) as pool:
+        yield from _store_replays(reports, pool.map(_replay_report, tasks), *stores)
+
+
+def _store_replays(reports, results, dataset_dir, warehouse_path, update_warehouse, page_cache_path):
+    # Stored in order, so overlapping reports dedupe against each other as they did at ingest
+    for (digest, file_name, version), (df, error) in zip(reports, results):
+        name = file_name or digest
+        if error is None:
+            try:
+                df = _store_replayed(digest, file_name, version, df, dataset_dir, warehouse_path, update_warehouse)
+                with closing(PageCache(page_cache_path)) as page_cache:
+                    page_cache.stamp(digest, PARSER_VERSION)
+            except Exception as e:
+                error = str(e)
+        if error:
+            logger.error("Could not replay %s: %s", name, error)
+            yield name, 0, error
+        else:
+            yield name, len(df), None
+
+
+def _replay_report(task):
+    digest, page_cache_path = task
+    try:
+        with closing(PageCache(page_cache_path)) as page_cache:
+            pages = page_cache.report_lines(digest)
+        if pages is None:
+            return None, "No cached text"
+        return replay_text(pages), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _store_replayed(digest, file_name, version, df, dataset_dir, warehouse_path, update_warehouse):
+    # Replace the results stored under the old parser version's key with the new ones
+    old_key, key = cache.report_key(digest, version=version), cache.report_key(digest)
+
+    with ExitStack() as stack:
+        conn, deduped = None, None
+        if warehouse_path is not None:
+            conn = stack.enter_context(closing(warehouse.connect(warehouse_path)))
+            deduped = warehouse.report_deduped(conn, old_key)
+            if deduped is None:
+                deduped = warehouse.report_deduped(conn, key)
+            if deduped and not update_warehouse:
+                raise ValueError("The warehouse stored it with dedupe, so it can only be replayed into the warehouse")
+
+        cache.invalidate(old_key)
+        cache.store(key, df)
+
+        if deduped is not None and update_warehouse:
+            warehouse.delete_report(conn, old_key)
+            warehouse.delete_report(conn, key)
+            stored = warehouse.store_report(conn, key, df, file_name, dedupe=deduped)
+            if deduped:
+                df = stored
+
+    if remove_partitions(old_key[:16], dataset_dir) + remove_partitions(key[:16], dataset_dir) and not df.empty:
+        write_partitions(df, key[:16], dataset_dir)
+    return df
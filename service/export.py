@@ -0,0 +1,156 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from service import timing
+
+MAX_CACHED_IMAGES = 32
+EXPORT_WORKERS = int(os.environ.get("BWE_EXPORT_WORKERS", min(4, os.cpu_count() or 1)))  # One per dashboard chart at most
+
+logger = logging.getLogger(__name__)
+_images = OrderedDict()  # figure digest -> PNG bytes, least recently used first
+_images_lock = threading.Lock()  # Sessions and export threads share the images
+_renderers = threading.local()  # Each export thread owns its renderer
+_service = None
+_service_lock = threading.Lock()
+
+
+def figure_digest(fig):
+    """
+    Return a digest of the figure's full content (data and layout), so identical
+    charts share one rendered image across reruns.
+    """
+    return hashlib.sha256(fig.to_json().encode("utf-8")).hexdigest()
+
+
+def cached_png(digest):
+    """
+    Return the PNG already rendered for a figure digest, or None.
+    """
+    with _images_lock:
+        if digest in _images:
+            _images.move_to_end(digest)
+            return _images[digest]
+    return None
+
+
+def _remember(digest, image):
+    with _images_lock:
+        _images[digest] = image
+        if len(_images) > MAX_CACHED_IMAGES:
+            _images.popitem(last=False)
+
+
+def _new_renderer():
+    try:
+        # kaleido < 1: each scope keeps its own Chromium process alive between exports
+        from kaleido.scopes.plotly import PlotlyScope
+    except ImportError:
+        # kaleido >= 1 (not in requirements.txt) has no scope to keep warm, so plotly.io renders each export cold
+        logger.warning("kaleido has no PlotlyScope, PNG exports will not use a warm renderer")
+        return None
+    # Same plotly.js bundle and MathJax as plotly.io's own scope, so images match pio.write_image
+    import plotly.io as pio
+
+    shared = pio.kaleido.scope
+    return PlotlyScope(plotlyjs=shared.plotlyjs, mathjax=shared.mathjax)
+
+
+def _render(fig):
+    if not hasattr(_renderers, "scope"):
+        _renderers.scope = _new_renderer()
+    if _renderers.scope is None:
+        import plotly.io as pio
+
+        return pio.to_image(fig, format="png")
+    return _renderers.scope.transform(fig, format="png")
+
+
+def _warm_up():
+    # Rendering an empty figure starts the thread's renderer before any real export.
+    # A failure here must not break the pool; real exports surface the error.
+    try:
+        import plotly.graph_objects as go  # Also pre-imports plotly off the main thread
+
+        _render(go.Figure())
+    except Exception as e:
+        logger.warning("Could not warm up PNG renderer: %s", e)
+
+
+class ExportService:
+    """
+    A pool of export threads, each with a warm kaleido renderer, that renders
+    batches of figures to PNG concurrently.
+    """
+
+    def __init__(self, workers=EXPORT_WORKERS):
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="png-export", initializer=_warm_up)
+        # The pool starts threads as tasks arrive, so queue no-ops to start (and warm) them all now
+        for _ in range(workers):
+            self._pool.submit(lambda: None)
+
+    def render(self, figs):
+        """
+        Render figures to PNG bytes, in the order given.
+        """
+        return list(self._pool.map(_render, figs))
+
+
+def get_service():
+    """
+    Return the shared export service, starting it in the background on first use.
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ExportService()
+    return _service
+
+
+def render_pngs(figs, stage="PNG export"):
+    """
+    Render figures to PNG bytes in one concurrent batch, reusing cached images
+    for figures whose content was rendered before.
+    """
+    digests = [figure_digest(fig) for fig in figs]
+    images = [cached_png(digest) for digest in digests]
+    missing = [index for index, image in enumerate(images) if image is None]
+
+    if missing:
+        with timing.span(stage, rows=len(missing)):
+            rendered = get_service().render([figs[index] for index in missing])
+        for index, image in zip(missing, rendered):
+            images[index] = image
+            _remember(digests[index], image)
+    return images
+
+
+def render_png(fig, digest=None, stage="PNG export"):
+    """
+    Render a single figure to PNG bytes, reusing the cached image when a figure
+    with the same content was rendered before.
+    """
+    image = cached_png(digest or figure_digest(fig))
+    if image is not None:
+        return image
+    return render_pngs([fig], stage)[0]
+
+
+def zip_pngs(figures, stage="ZIP export"):
+    """
+    Render `{file name: figure}` in one batch and pack the PNGs into a ZIP archive.
+    """
+    images = render_pngs(list(figures.values()), stage)
+
+    buf = io.BytesIO()
+    # PNGs are already compressed, storing them keeps the archive quick to build
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_STORED) as archive:
+        for file_name, image in zip(figures, images):
+            archive.writestr(file_name, image)
+    return buf.getvalue()
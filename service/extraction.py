@@ -0,0 +1,135 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from service import timing
+from service.pools import EXTRACT_PARALLEL_MIN_PAGES, pool_context, task_size
+
+SPOOL_THRESHOLD = int(os.environ.get("BWE_SPOOL_THRESHOLD", 32 * 1024 * 1024))  # Bytes
+
+_worker_doc = None  # Document opened once per pool worker
+
+
+@contextmanager
+def pdf_source(uploaded_file, spool_threshold=SPOOL_THRESHOLD):
+    """
+    Yield a source for `open_pdf` without copying the upload in Python.
+
+    Paths, bytes and memoryviews are used as-is. For in-memory uploads such as
+    Streamlit's `UploadedFile`, `getvalue()` hands back the BytesIO's own bytes
+    (`getbuffer()` would force a private copy). From `spool_threshold` bytes the
+    upload is spooled to a temporary file that `fitz` and pool workers open by path.
+    """
+    if isinstance(uploaded_file, (str, Path)):
+        yield uploaded_file
+        return
+
+    if isinstance(uploaded_file, (bytes, bytearray, memoryview)):
+        data = uploaded_file
+    elif hasattr(uploaded_file, "getvalue"):
+        data = uploaded_file.getvalue()
+    else:
+        data = uploaded_file.read()
+
+    if memoryview(data).nbytes < spool_threshold:
+        yield data
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as spooled:
+        with timing.span("Spool upload"):
+            spooled.write(data)
+            spooled.flush()
+        yield spooled.name
+
+
+@timing.timed("PDF open")
+def open_pdf(source):
+    """
+    Open a PDF from raw bytes, a memoryview or a file path.
+    """
+    import fitz  # PyMuPDF is slow to import, load it with the first PDF rather than at app start-up
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+def extract_page_lines(page):
+    """
+    Extract the text lines of a single page.
+    """
+    return page.get_text().split("\n")
+
+
+@timing.timed("Text extraction")
+def extract_pages(source, workers=None, page_numbers=None):
+    """
+    Extract the text lines of every page (or only of `page_numbers`), as one list
+    of lines per page in the order requested.
+
+    Large documents are split into page ranges across a process pool, each worker
+    opening its own document from the same bytes/path. Small documents are
+    extracted serially.
+    """
+    workers = workers or os.cpu_count() or 1
+
+    with open_pdf(source) as doc:
+        if page_numbers is None:
+            page_numbers = range(doc.page_count)
+        if workers <= 1 or len(page_numbers) < EXTRACT_PARALLEL_MIN_PAGES:
+            return [extract_page_lines(doc[number]) for number in page_numbers]
+
+    # Workers may be spawned rather than forked, so they need a picklable source
+    if isinstance(source, memoryview):
+        source = bytes(source)
+
+    pages_per_task = task_size(len(page_numbers), workers)
+    tasks = [page_numbers[start:start + pages_per_task] for start in range(0, len(page_numbers), pages_per_task)]
+
+    pool = ProcessPoolExecutor(
+        max_workers=min(workers, len(tasks)), mp_context=pool_context(), initializer=_init_worker, initargs=(source,),
+    )
+    with pool:
+        return [lines for chunk in pool.map(_extract_numbers, tasks) for lines in chunk]
+
+
+def iter_extract_pages(source, page_numbers, batch_pages, workers=None):
+    """
+    Extract the text lines of `page_numbers` like `extract_pages`, but yield them
+    `batch_pages` pages at a time, in order, as soon as each batch is extracted.
+
+    Closing the generator early cancels the batches not started yet. It runs in
+    the app's job threads, so its workers are not forked (see `pool_context`).
+    """
+    workers = workers or os.cpu_count() or 1
+    tasks = [page_numbers[start:start + batch_pages] for start in range(0, len(page_numbers), batch_pages)]
+    if not tasks:
+        return
+
+    if workers <= 1 or len(page_numbers) < EXTRACT_PARALLEL_MIN_PAGES:
+        with open_pdf(source) as doc:
+            for numbers in tasks:
+                yield [extract_page_lines(doc[number]) for number in numbers]
+        return
+
+    if isinstance(source, memoryview):
+        source = bytes(source)
+
+    pool = ProcessPoolExecutor(
+        max_workers=min(workers, len(tasks)), mp_context=pool_context(), initializer=_init_worker, initargs=(source,),
+    )
+    try:
+        yield from pool.map(_extract_numbers, tasks)
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def _init_worker(source):
+    global _worker_doc
+    _worker_doc = open_pdf(source)
+
+
+def _extract_numbers(page_numbers):
+    return [extract_page_lines(_worker_doc[number]) for number in page_numbers]
@@ -1,24 +1,72 @@
-from io import BytesIO
+import logging
+import os
+from contextlib import closing
+from itertools import islice
+from pathlib import Path
 
-import fitz
 import pandas as pd
-import re
 
-def process_pdf(uploaded_file):
+from service import cache, timing
+from service.extraction import extract_page_lines, extract_pages, iter_extract_pages, open_pdf, pdf_source
+from service.layout import parse_layout
+from service.pages import PAGE_CACHE_PATH, PageCache, missing_pages, page_fingerprints, partial_key
+from service.parsing import PARSER_VERSION, LineParser, chunk_context, parse_lines, parse_pages, parse_partials
+from service.schema import to_frame
+
+STREAM_BATCH_PAGES = int(os.environ.get("BWE_STREAM_BATCH_PAGES", 20))  # Pages per progress update
+HEADERS = ["Customer Name", "Account Number", "Item Name", "Item Number", "Price", "Date Sold"]
+
+logger = logging.getLogger(__name__)
+
+def process_pdf(
+    uploaded_file, workers=None, use_cache=True, parser="text", digest=None, file_name=None, max_pages=None,
+):
     """
-    Extract text from a PDF file object, clean up duplicate headers, and process data.
+    Extract text from a PDF file object (or path), clean up duplicate headers, and process data.
+
+    `workers` caps the processes used for extraction and parsing (defaults to the CPU count).
+    `parser="layout"` reads columns from word positions instead of text line order.
+    Results are cached on disk by PDF content, so re-uploads skip parsing entirely.
+    Callers that already computed the upload's `cache.source_digest` can pass it as `digest`,
+    and name raw bytes with `file_name`.
+
+    With `max_pages`, only the report's leading pages are parsed, as a quick preview
+    (see `parse_leading_pages`); previews are not cached, but the full result is
+    returned when it already is.
     """
     try:
-        # Open the PDF directly from bytes instead of a file path
-        pdf_bytes = BytesIO(uploaded_file.read())  # Convert uploaded file to byte stream
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")  # Open from byte stream
+        # Open the PDF from the upload's own buffer (or a spooled file) instead of copies
+        with pdf_source(uploaded_file) as source:
+            digest = digest or cache.source_digest(source)
+            key = cache.report_key(digest, parser)
+            if use_cache:
+                with timing.span("Cache lookup"):
+                    cached_df = cache.load(key)
+                if cached_df is not None:
+                    cached_df.attrs.update(source_key=key, source_digest=digest)
+                    return cached_df
+
+            if max_pages is not None:
+                preview_df = parse_leading_pages(source, max_pages, workers)
+                preview_df.attrs.update(source_key=f"{key}:pages={max_pages}", source_digest=digest)
+                return preview_df
 
-        all_lines = [line for page in doc for line in page.get_text().split("\n")]
-        df = pd.DataFrame(all_lines, columns=["Content"])
+            if parser == "layout":
+                processed_df = parse_layout(source)
+            elif use_cache:
+                # Pages seen in earlier reports reuse their cached lines and partial parses
+                processed_df = parse_cached_pages(
+                    source, workers, digest=digest, file_name=file_name or _file_name(uploaded_file),
+                )
+            else:
+                processed_df = parse_uncached_pages(source, workers)
 
-        df_cleaned = remove_duplicate_headers(df)
-        processed_df = process_data(df_cleaned)
+        if use_cache:
+            with timing.span("Cache store", rows=len(processed_df)):
+                cache.store(key, processed_df)
 
+        # Lets downstream caches (e.g. dashboard aggregates) key on the PDF's content
+        processed_df.attrs.update(source_key=key, source_digest=digest)
         return processed_df
     except Exception as e:
         raise RuntimeError(f"Error processing PDF: {e}")
@@ -31,82 +79,227 @@ def process_pdf(uploaded_file):
 
     return processed_df
 
+@timing.timed("Header dedupe")
 def remove_duplicate_headers(df):
     """
     Identifies and removes duplicate column headers that appear across pages.
     """
-    headers = ["Customer Name", "Account Number", "Item Name", "Item Number", "Price", "Date Sold"]
+    cleaned_lines = [line for page in iter_unique_header_pages([df["Content"]]) for line in page]
 
-    cleaned_lines = []
+    # Convert cleaned data back into a DataFrame
+    return pd.DataFrame(cleaned_lines, columns=["Content"])
+
+def _file_name(uploaded_file):
+    # Uploads carry their name, paths are their own name
+    if isinstance(uploaded_file, (str, Path)):
+        return Path(uploaded_file).name
+    return getattr(uploaded_file, "name", None)
+
+def is_header_line(line):
+    """
+    Whether a line holds all the report's column headers.
+    """
+    return all(header in line for header in HEADERS)
+
+def iter_unique_header_pages(pages):
+    """
+    Lazily drop duplicate column headers from an iterable of per-page line lists.
+    """
     seen_headers = False  # Flag to track if we’ve seen the headers before
 
-    for line in df["Content"]:
-        if all(header in line for header in headers):  # If line contains all column headers
-            if seen_headers:  # Skip duplicate headers after the first occurrence
-                continue
-            seen_headers = True  # Mark headers as seen
-        cleaned_lines.append(line)  # Add the valid line
+    for lines in pages:
+        cleaned_lines = []
+        for line in lines:
+            if is_header_line(line):  # If line contains all column headers
+                if seen_headers:  # Skip duplicate headers after the first occurrence
+                    continue
+                seen_headers = True  # Mark headers as seen
+            cleaned_lines.append(line)  # Add the valid line
+        yield cleaned_lines
 
-    # Convert cleaned data back into a DataFrame
-    return pd.DataFrame(cleaned_lines, columns=["Content"])
+def parse_uncached_pages(source, workers=None):
+    """
+    Extract and parse every page of a PDF, without the page-level cache.
+    """
+    # Large documents are extracted and parsed in parallel, page order is preserved
+    pages = extract_pages(source, workers)
+    with timing.span("Header dedupe", rows=sum(len(lines) for lines in pages)):
+        pages = list(iter_unique_header_pages(pages))
+    return parse_pages(pages, workers)
+
+def parse_cached_pages(source, workers=None, page_cache_path=PAGE_CACHE_PATH, digest=None, file_name=None):
+    """
+    Parse a PDF through the page-level cache, so pages already seen in earlier
+    (e.g. overlapping cumulative) reports are neither extracted nor parsed again.
+
+    Pages are fingerprinted from their content streams. Only pages with unknown
+    fingerprints are extracted, and only pages whose lines and parser context
+    are new are parsed; cached partial parses are spliced in page order. A
+    report with a page that cannot be fingerprinted bypasses the cache.
+
+    With the PDF's `digest`, the report's manifest is recorded too, so its text
+    can later be re-parsed without the PDF (see `replay_text`).
+    """
+    with open_pdf(source) as doc, timing.span("Page fingerprints", rows=doc.page_count):
+        fingerprints = page_fingerprints(doc)
+    if None in fingerprints:
+        return parse_uncached_pages(source, workers)
+
+    with closing(PageCache(page_cache_path)) as page_cache:
+        with timing.span("Page cache lookup", rows=len(fingerprints)) as record:
+            page_lines = page_cache.get("page_lines", set(fingerprints))
+            record["rows"] = len(page_lines)
+
+        missing = missing_pages(fingerprints, page_lines)
+        if missing:
+            extracted = extract_pages(source, workers, list(missing.values()))
+            new_lines = dict(zip(missing, extracted))
+            page_cache.put("page_lines", new_lines)
+            page_lines.update(new_lines)
+        if digest:
+            page_cache.store_manifest(digest, fingerprints, PARSER_VERSION, file_name)
+
+        pages = [page_lines[fingerprint] for fingerprint in fingerprints]
+        with timing.span("Header dedupe", rows=sum(len(lines) for lines in pages)):
+            headers_seen = headers_seen_before(pages)
+            pages = list(iter_unique_header_pages(pages))
+
+        return splice_page_partials(pages, fingerprints, headers_seen, page_cache, workers)
+
+
+def stream_cached_pages(
+    source, workers=None, batch_pages=STREAM_BATCH_PAGES, page_cache_path=PAGE_CACHE_PATH, digest=None, file_name=None,
+):
+    """
+    Parse a PDF a batch of pages at a time, so callers can report progress and
+    show early rows. Yields `(pages_done, page_count, rows)` after each batch,
+    with the rows completed since the previous one.
+
+    Pages go through the page-level line cache as in `parse_cached_pages`;
+    uncached pages are extracted in a process pool ahead of the parser. The
+    report's manifest is recorded once the last batch is parsed, so a stream
+    closed early leaves no trace of the report.
+    """
+    with open_pdf(source) as doc, timing.span("Page fingerprints", rows=doc.page_count):
+        fingerprints = page_fingerprints(doc)
+    # A page that cannot be fingerprinted makes the whole report bypass the cache
+    cacheable = None not in fingerprints
+    keys = fingerprints if cacheable else list(range(len(fingerprints)))
+
+    with closing(PageCache(page_cache_path)) as page_cache:
+        page_lines = page_cache.get("page_lines", set(keys)) if cacheable else {}
+        missing = missing_pages(keys, page_lines)
+        extracted = iter_extract_pages(source, list(missing.values()), batch_pages, workers)
+        pending = iter(missing)  # Keys in extraction order
+
+        def pages():
+            for key in keys:
+                while key not in page_lines:
+                    batch = next(extracted)
+                    new_lines = dict(zip(islice(pending, len(batch)), batch))
+                    if cacheable:
+                        page_cache.put("page_lines", new_lines)
+                    page_lines.update(new_lines)
+                yield page_lines[key]
+
+        parser, batch = LineParser(), []
+        try:
+            for pages_done, lines in enumerate(iter_unique_header_pages(pages()), start=1):
+                batch += lines
+                if pages_done % batch_pages and pages_done < len(fingerprints):
+                    continue
+                # Classifying lines has a fixed cost per call, so the parser is fed whole batches
+                rows, batch = parser.feed(batch), []
+                if pages_done == len(fingerprints):
+                    rows += parser.close()
+                    if digest and cacheable:
+                        page_cache.store_manifest(digest, fingerprints, PARSER_VERSION, file_name)
+                yield pages_done, len(fingerprints), rows
+        finally:
+            extracted.close()
+
+
+@timing.timed("Preview parse")
+def parse_leading_pages(source, max_pages, workers=None):
+    """
+    Parse only the first `max_pages` pages of a PDF, extracted serially from one
+    open document. The frame's attrs record `preview_pages` and `page_count`.
+
+    Items on the last page whose price or date spill onto the next one are
+    missing, so aggregates over a preview are approximate.
+    """
+    with open_pdf(source) as doc:
+        page_count = doc.page_count
+        with timing.span("Text extraction", rows=min(max_pages, page_count)):
+            pages = [extract_page_lines(doc[number]) for number in range(min(max_pages, page_count))]
+
+    preview_df = parse_pages(list(iter_unique_header_pages(pages)), workers)
+    preview_df.attrs.update(preview_pages=len(pages), page_count=page_count)
+    return preview_df
+
+
+def headers_seen_before(pages):
+    """
+    Flag, for each page, whether an earlier page already held the column headers
+    (so header dedupe drops them from this page).
+    """
+    flags, seen = [], False
+    for lines in pages:
+        flags.append(seen)
+        seen = seen or any(is_header_line(line) for line in lines)
+    return flags
+
+
+def replay_text(pages):
+    """
+    Parse a report's cached text layer (one list of lines per page) with the
+    current parser, without the PDF.
+    """
+    pages = list(iter_unique_header_pages(pages))
+    return parse_pages(pages, workers=1)
+
+
+@timing.timed("Parsing")
+def splice_page_partials(pages, fingerprints, headers_seen, page_cache, workers=None):
+    """
+    Parse header-deduped pages one page at a time, reusing cached partial parses.
 
+    A page's partial depends on its own lines and on the look-behind/look-ahead
+    lines around it, all of which are part of its cache key.
+    """
+    all_lines = [line for lines in pages for line in lines]
+    keys, chunks = [], {}
+    start = 0
+    for lines, fingerprint, seen in zip(pages, fingerprints, headers_seen):
+        stop = start + len(lines)
+        before, after = chunk_context(all_lines, start, stop)
+        key = partial_key(fingerprint, seen, before, after, PARSER_VERSION)
+        keys.append(key)
+        chunks.setdefault(key, (lines, before, after))
+        start = stop
+
+    partials = page_cache.get("page_partials", chunks)
+    todo = [key for key in chunks if key not in partials]
+    if todo:
+        parsed = dict(zip(todo, parse_partials([chunks[key] for key in todo], workers)))
+        page_cache.put("page_partials", parsed)
+        partials.update(parsed)
+
+    parser = LineParser()
+    rows = []
+    for key in keys:
+        rows += parser.feed_partial(*partials[key])
+    rows += parser.close()
+    return to_frame(rows)
+
+@timing.timed("Parsing")
 def process_data(df):
     """
     Process extracted and cleaned PDF data ensuring items are assigned to correct customers.
     """
-    rows = []
-    product_data = []  # Store items until assigned
-    current_customer = None
-    current_account = None
-
-    for idx, row in df.iterrows():
-        content = row["Content"].strip()
-
-        # **Step 1: Detect customers BEFORE processing items**
-        if re.match(r"^[A-Za-z\s,.\(\)&'-]+$", content) and idx + 1 < len(df):
-            potential_account = df.iloc[idx + 1]["Content"].strip()
-            if re.match(r"^\d{3,5}$", potential_account):  # Ensure account number format
-                # Assign items to the previous customer before changing
-                if current_customer and current_account and product_data:
-                    for item in product_data:
-                        rows.append([current_customer, current_account] + item)
-                    product_data = []  # Reset items for the new customer
-
-                # Update new customer info
-                current_customer = content
-                current_account = potential_account
-                print(f"Detected Customer: {current_customer}, Account: {current_account}")
-                continue  # Move to next line
-
-        # **Step 2: Detect item numbers and store them**
-        elif re.match(r"^\d{1,5}-[\d]+$", content.replace(",", "")):  # Allow up to 5 digits before "-"
-            item_number = content.replace(",", "")  # Remove commas from item numbers
-
-            try:
-                item_name = df.iloc[idx - 1]["Content"].strip()  # Item Name appears before Item Number
-                price_line = df.iloc[idx + 1]["Content"].strip()  # Price is after Item Number
-                price = float(price_line.replace("$", "").replace(",", "")) if "$" in price_line else None
-                date_sold = df.iloc[idx + 2]["Content"].strip()  # Date Sold appears after Price
-
-                # Store item but do not assign yet
-                product_data.append([item_name, item_number, price, date_sold])
-                print(f"Processing Item - Name: {item_name}, Number: {item_number}, Price: {price}, Date: {date_sold}")
-
-            except Exception as e:
-                print(f"Error processing item data: {e}")
-
-            continue
-
-    # **Store the last batch of customer data**
-    if current_customer and current_account and product_data:
-        for item in product_data:
-            rows.append([current_customer, current_account] + item)
-
-    # Convert to DataFrame
-    columns = ["Crafter Name", "Account Number", "Item Name", "Item Number", "Price", "Date Sold"]
-    result_df = pd.DataFrame(rows, columns=columns)
-
-    print("\nFinal Processed DataFrame:")
-    print(result_df.head(50))
+    result_df = parse_lines(df["Content"])
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Final processed DataFrame:\n%s", result_df.head(50))
 
     return result_df
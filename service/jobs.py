@@ -0,0 +1,248 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
+from service import cache, timing
+from service.extraction import pdf_source
+from service.ingestion import process_pdf, stream_cached_pages
+from service.pools import pool_context
+from service.schema import to_frame
+
+INGEST_WORKERS = int(os.environ.get("BWE_INGEST_WORKERS", os.cpu_count() or 1))  # Reports parsed at once
+
+logger = logging.getLogger(__name__)
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Return the process pool shared by every session's pooled jobs, one report per
+    worker. It is created from the app's threads, so its workers are not forked.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=INGEST_WORKERS, mp_context=pool_context())
+    return _pool
+
+
+def replace_pool(broken):
+    """
+    Replace the shared pool after `broken` lost a worker (which breaks the whole
+    pool), unless another job already did. Returns the new shared pool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+    return get_pool()
+
+
+def wait_all(jobs, timeout=None):
+    """
+    Wait up to `timeout` seconds in total for every job to finish. Returns whether they all did.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for job in jobs:
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        if not job.wait(remaining):
+            return False
+    return True
+
+
+@dataclass(frozen=True)
+class JobProgress:
+    """
+    Snapshot of an ingestion job. `page_count` is None until the PDF is opened.
+    """
+
+    pages_done: int
+    page_count: int | None
+    rows: int
+    elapsed: float  # Seconds since the job started
+
+    @property
+    def fraction(self):
+        return self.pages_done / self.page_count if self.page_count else 0.0
+
+    @property
+    def eta(self):
+        """
+        Seconds left at the rate so far, or None before the first batch.
+        """
+        if not self.pages_done or self.page_count is None:
+            return None
+        return self.elapsed / self.pages_done * (self.page_count - self.pages_done)
+
+
+class IngestJob:
+    """
+    Parse an uploaded PDF (its bytes) in a background thread, so the caller can
+    poll `progress()` and show `partial()` rows while the report is processed.
+
+    Reports already in the parsed cache finish at once. Otherwise the PDF is
+    parsed a batch of pages at a time with `stream_cached_pages`, and `cancel()`
+    stops it at the next batch. A cancelled job caches no result and records no
+    manifest, but the text of the pages it extracted stays in the page cache,
+    so parsing the report again skips them.
+
+    With a `pool` (see `get_pool`), the whole report is parsed in one of the
+    pool's processes instead, so several jobs parse in parallel; progress then
+    only moves when the report is done, and `cancel()` only stops it if it has
+    not started yet. A pool broken by a dying worker is replaced (see
+    `replace_pool`) and the report resubmitted once.
+    """
+
+    def __init__(self, data, digest, file_name=None, workers=None, pool=None):
+        self.digest = digest
+        self.file_name = file_name
+        self.workers = workers
+        self.pool = pool
+        self._spans = []  # Timing spans of the job's thread, once done
+        self._data = data
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._done = threading.Event()
+        self._rows = []
+        self._partial = to_frame([])  # Frame of the rows so far, rebuilt when rows are added
+        self._pages_done, self._page_count = 0, None
+        self._started = None
+        self._future = None
+        self._result, self._error = None, None
+        self._thread = threading.Thread(target=self._run, name=f"ingest-{digest[:8]}", daemon=True)
+
+    def start(self):
+        self._started = time.monotonic()
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+        future = self._future
+        if future is not None:
+            future.cancel()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def failed(self):
+        return self._error is not None
+
+    def wait(self, timeout=None):
+        """
+        Wait up to `timeout` seconds for the job to finish. Returns whether it did.
+        """
+        return self._done.wait(timeout)
+
+    def progress(self):
+        with self._lock:
+            return JobProgress(self._pages_done, self._page_count, len(self._rows), time.monotonic() - self._started)
+
+    def partial(self):
+        """
+        The rows parsed so far, in the typed schema, with the pages they cover in
+        attrs `preview_pages` and `page_count`. It has no `source_key`, so result
+        caches never hold on to it.
+        """
+        with self._lock:
+            if len(self._partial) != len(self._rows):
+                self._partial = to_frame(self._rows)
+            self._partial.attrs.update(preview_pages=self._pages_done, page_count=self._page_count)
+            return self._partial.copy()
+
+    def result(self):
+        """
+        The processed report once the job is done. Raises if it failed or was cancelled.
+        """
+        if self._error is not None:
+            raise RuntimeError(f"Error processing PDF: {self._error}")
+        if self._result is None:
+            raise RuntimeError("Processing was cancelled" if self.cancelled else "Processing is not finished")
+        return self._result
+
+    def take_spans(self):
+        """
+        Return the timing spans recorded by the finished job, once.
+        """
+        spans, self._spans = self._spans, []
+        return spans
+
+    def _run(self):
+        try:
+            key = cache.report_key(self.digest)
+            with timing.span("Cache lookup"):
+                processed_df = cache.load(key)
+            if processed_df is None:
+                if self.pool is None:
+                    with pdf_source(self._data) as source:
+                        processed_df = self._parse(source)
+                else:
+                    processed_df = self._parse_in_pool()
+                if processed_df is None or self.cancelled:
+                    logger.info("Cancelled processing %s", self.file_name or self.digest)
+                    return
+                if self.pool is None:
+                    with timing.span("Cache store", rows=len(processed_df)):
+                        cache.store(key, processed_df)
+
+            processed_df.attrs.update(source_key=key, source_digest=self.digest)
+            self._result = processed_df
+        except Exception as e:
+            logger.error("Could not process %s: %s", self.file_name or self.digest, e)
+            self._error = e
+        finally:
+            self._data = None  # Releases the upload's bytes
+            self._spans = timing.collect()
+            self._done.set()
+
+    def _parse_in_pool(self):
+        # The worker parses serially and stores the result in the parsed cache itself
+        with timing.span("Pooled parse") as record:
+            try:
+                processed_df = self._submit()
+            except BrokenProcessPool:
+                # A worker died (maybe parsing another job's report), so the job is resubmitted once to a new pool
+                logger.warning("Process pool broke while parsing %s, resubmitting it", self.file_name or self.digest)
+                self.pool = replace_pool(self.pool)
+                processed_df = self._submit()
+            if processed_df is not None:
+                record["rows"] = len(processed_df)
+        return processed_df
+
+    def _submit(self):
+        self._future = self.pool.submit(
+            process_pdf, self._data, workers=1, digest=self.digest, file_name=self.file_name,
+        )
+        if self.cancelled:
+            self._future.cancel()
+        try:
+            return self._future.result()
+        except CancelledError:
+            return None
+
+    def _parse(self, source):
+        batches = stream_cached_pages(source, self.workers, digest=self.digest, file_name=self.file_name)
+        with timing.span("Streaming parse") as record:
+            try:
+                for pages_done, page_count, rows in batches:
+                    with self._lock:
+                        self._rows += rows
+                        self._pages_done, self._page_count = pages_done, page_count
+                    if self._cancelled.is_set():
+                        return None
+            finally:
+                batches.close()  # Stops extraction workers when cancelled
+            record["rows"] = len(self._rows)
+        return to_frame(self._rows)
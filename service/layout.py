@@ -0,0 +1,187 @@
+import logging
+import re
+
+from service import timing
+from service.extraction import open_pdf
+from service.parsing import ACCOUNT_NUMBER_PATTERN, CUSTOMER_NAME_PATTERN, ITEM_NUMBER_PATTERN, LineParser
+from service.schema import to_frame
+
+# Fallback x-centres (points) of the "Sales by Account Report" columns, for pages
+# whose column headings are not found. Customer rows and item rows use different
+# column sets, so they are binned separately.
+CUSTOMER_COLUMNS = {
+    "Account Number": 57,
+    "Customer Name": 94,
+}
+ITEM_COLUMNS = {
+    "Date Sold": 80,
+    "Date Posted": 128,
+    "Item Number": 189,
+    "Item Name": 269,
+    "Price": 441,
+    "Split Coupons": 480,
+    "Item Fee": 537,
+}
+
+# Column heading -> column. A heading may be split over two stacked header lines
+# ("DATE" over "SOLD"); those in REQUIRED_HEADINGS must all be found for the
+# positions of a page's headings to replace the fallback ones.
+CUSTOMER_HEADINGS = {"ACCOUNT": "Account Number", "NAME": "Customer Name"}
+ITEM_HEADINGS = {
+    "DATE SOLD": "Date Sold",
+    "DATE POSTED": "Date Posted",
+    "ITEM #": "Item Number",
+    "ITEM NAME": "Item Name",
+    "PRICE": "Price",
+    "SPLIT COUPONS": "Split Coupons",
+    "ITEM FEE": "Item Fee",
+}
+REQUIRED_HEADINGS = {"ACCOUNT", "DATE SOLD", "ITEM #", "ITEM NAME", "PRICE"}
+
+ROW_TOLERANCE = 4  # Cells whose vertical centres are this close share a row
+HEADING_TOLERANCE = 10  # Stacked heading lines whose x-centres are this close form one heading
+TOTAL_ROW_PREFIX = "TOTAL"
+
+logger = logging.getLogger(__name__)
+
+
+def page_rows(page):
+    """
+    Group the words of a page into visual rows of `(x_centre, text)` cells, top
+    to bottom. Each cell is one PDF text line.
+    """
+    lines = {}
+    for x0, y0, x1, y1, word, block_no, line_no, _ in page.get_text("words"):
+        lines.setdefault((block_no, line_no), []).append((x0, y0, x1, y1, word))
+
+    cells = []
+    for words in lines.values():
+        x0 = min(word[0] for word in words)
+        x1 = max(word[2] for word in words)
+        y0 = min(word[1] for word in words)
+        y1 = max(word[3] for word in words)
+        cells.append(((y0 + y1) / 2, (x0 + x1) / 2, " ".join(word[4] for word in words)))
+    cells.sort()
+
+    rows = []
+    row_y = None
+    for y, x, text in cells:
+        if row_y is None or y - row_y > ROW_TOLERANCE:
+            rows.append([])
+            row_y = y
+        rows[-1].append((x, text))
+    return rows
+
+
+def heading_centres(rows):
+    """
+    Find the column headings among a page's rows, as `{heading: x_centre}`.
+    Each cell is matched joined with the cell stacked below it in the next row
+    (centred between the two), or on its own text.
+    """
+    headings = set(CUSTOMER_HEADINGS) | set(ITEM_HEADINGS)
+    centres = {}
+    for row, next_row in zip(rows, rows[1:] + [[]]):
+        for x, text in row:
+            below = [cell for cell in next_row if abs(cell[0] - x) <= HEADING_TOLERANCE]
+            if below and f"{text} {below[0][1]}" in headings:
+                centres.setdefault(f"{text} {below[0][1]}", (x + below[0][0]) / 2)
+            elif text in headings:
+                centres.setdefault(text, x)
+    return centres
+
+
+def page_columns(rows):
+    """
+    The `(customer_columns, item_columns)` x-centres of a page, from its column
+    headings when they are all found, otherwise `CUSTOMER_COLUMNS` and
+    `ITEM_COLUMNS`. Columns whose optional heading is missing keep their
+    fallback centre.
+    """
+    centres = heading_centres(rows)
+    if not REQUIRED_HEADINGS <= centres.keys():
+        return CUSTOMER_COLUMNS, ITEM_COLUMNS
+
+    customer_columns = {**CUSTOMER_COLUMNS}
+    item_columns = {**ITEM_COLUMNS}
+    for heading, x in centres.items():
+        if heading in CUSTOMER_HEADINGS:
+            customer_columns[CUSTOMER_HEADINGS[heading]] = x
+        else:
+            item_columns[ITEM_HEADINGS[heading]] = x
+    return customer_columns, item_columns
+
+
+def bin_cells(row, columns):
+    """
+    Assign each cell of a row to the column with the nearest x-centre.
+    """
+    binned = {}
+    for x, text in row:
+        column = min(columns, key=lambda name: abs(columns[name] - x))
+        binned.setdefault(column, text)
+    return binned
+
+
+def parse_layout_page(page):
+    """
+    Parse one page from word positions into `(leading, segments, parse_errors)`,
+    the same partial result `PartialParser` produces, so pages stitch with
+    `LineParser.feed_partial`.
+    """
+    leading = []
+    segments = []
+    parse_errors = 0
+    item_like_rows = 0  # Rows with an item number in any column
+
+    rows = page_rows(page)
+    customer_columns, item_columns = page_columns(rows)
+    for row in rows:
+        if any(text.startswith(TOTAL_ROW_PREFIX) for _, text in row):
+            continue  # Totals repeat the customer and sum its items
+        if any(re.match(ITEM_NUMBER_PATTERN, text.replace(",", "")) for _, text in row):
+            item_like_rows += 1
+
+        item = bin_cells(row, item_columns)
+        item_number = item.get("Item Number", "").replace(",", "")
+        if re.match(ITEM_NUMBER_PATTERN, item_number):
+            price_line = item.get("Price", "")
+            try:
+                price = float(price_line.replace("$", "").replace(",", "")) if "$" in price_line else None
+            except ValueError as e:
+                parse_errors += 1
+                logger.debug("Error processing item %s: %s", item_number, e)
+                continue
+
+            parsed = [item.get("Item Name", ""), item_number, price, item.get("Date Sold", "")]
+            (segments[-1][2] if segments else leading).append(parsed)
+            continue
+
+        customer = bin_cells(row, customer_columns)
+        name = customer.get("Customer Name", "")
+        account = customer.get("Account Number", "")
+        if re.match(CUSTOMER_NAME_PATTERN, name) and re.match(ACCOUNT_NUMBER_PATTERN, account):
+            segments.append((name, account, []))
+
+    if item_like_rows and not leading and not any(items for _, _, items in segments):
+        logger.warning(
+            "Page %d has %d item rows but none were parsed; its columns may not be where expected",
+            page.number + 1, item_like_rows,
+        )
+    return leading, segments, parse_errors
+
+
+@timing.timed("Layout parsing")
+def parse_layout(source):
+    """
+    Parse a PDF (bytes or path) into one row per sold item using word positions
+    instead of text line order.
+    """
+    parser = LineParser()
+    rows = []
+    with open_pdf(source) as doc:
+        for page in doc:
+            rows += parser.feed_partial(*parse_layout_page(page))
+    rows += parser.close()
+
+    return to_frame(rows)
@@ -0,0 +1,19 @@
+import logging
+import os
+
+LOG_LEVELS = os.environ.get("BWE_LOG_LEVEL", "WARNING,service=INFO")
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+def configure_logging(spec=LOG_LEVELS):
+    """
+    Configure log levels from a spec such as "WARNING,service.parsing=DEBUG":
+    a bare level applies to the root logger, `module=LEVEL` pairs override it
+    per module. Safe to call on every Streamlit rerun.
+    """
+    logging.basicConfig(format=LOG_FORMAT)
+
+    for part in spec.split(","):
+        name, _, level = part.strip().rpartition("=")
+        if level:
+            logging.getLogger(name or None).setLevel(level.upper())
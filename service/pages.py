@@ -0,0 +1,231 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+
+PAGE_CACHE_PATH = Path(os.environ.get("BWE_PAGE_CACHE", ".cache/pages.sqlite"))
+PAGE_CACHE_MAX_ENTRIES = int(os.environ.get("BWE_PAGE_CACHE_MAX_ENTRIES", 200_000))  # Per table
+BUSY_TIMEOUT = 60  # Seconds to wait for another session's write
+
+TABLES = ("page_lines", "page_partials")
+
+logger = logging.getLogger(__name__)
+
+# The text layer of each report: its pages' fingerprints, and the parser version
+# its current parsed results were produced with
+MANIFEST_SQL = """
+CREATE TABLE IF NOT EXISTS reports (
+    digest TEXT PRIMARY KEY,
+    file_name TEXT,
+    page_count INTEGER NOT NULL,
+    parser_version INTEGER NOT NULL,
+    stored_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS report_pages (
+    digest TEXT NOT NULL REFERENCES reports (digest) ON DELETE CASCADE,
+    page_number INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    PRIMARY KEY (digest, page_number)
+);
+CREATE INDEX IF NOT EXISTS report_pages_fingerprint ON report_pages (fingerprint);
+"""
+
+
+def page_fingerprints(doc):
+    """
+    Fingerprint every page of an open document without extracting its text.
+
+    A page's fingerprint hashes its content stream and the streams of the Form
+    XObjects it draws (nested ones included), together with the name, encoding
+    and ToUnicode map of each font they use, since identical content bytes only
+    decode to identical text under identical fonts.
+
+    Pages whose streams cannot be read get None: they cannot be cached safely.
+    """
+    font_digests = {}  # font xref -> digest, fonts are usually shared by every page
+    fingerprints = []
+    for page in doc:
+        try:
+            fingerprints.append(_page_fingerprint(doc, page, font_digests))
+        except Exception as e:
+            logger.warning("Could not fingerprint page %d, the page cache is skipped: %s", page.number, e)
+            fingerprints.append(None)
+    return fingerprints
+
+
+def _page_fingerprint(doc, page, font_digests):
+    digest = hashlib.sha256(page.read_contents())
+
+    # Text drawn through forms (e.g. `/fzFrm0 Do`) lives in their streams, not the page's
+    form_names = {0: ""}  # xref of a font's referencer -> form name, 0 for the page itself
+    for xref, name, referencer, _ in page.get_xobjects():
+        form_names[xref] = f"{form_names.get(referencer, referencer)}/{name}"
+        stream = doc.xref_stream(xref)
+        if stream is None:
+            raise ValueError(f"form {name} has no stream")
+        digest.update(f"{form_names[xref]}:{len(stream)}:".encode())
+        digest.update(stream)
+
+    for xref, _, _, basefont, name, encoding, referencer in page.get_fonts(full=True):
+        if xref not in font_digests:
+            font_digests[xref] = _font_digest(doc, xref, basefont, encoding)
+        digest.update(f"{form_names.get(referencer, referencer)}/{name}={font_digests[xref]};".encode())
+    return digest.hexdigest()
+
+
+def _font_digest(doc, xref, basefont, encoding):
+    digest = hashlib.sha256(f"{basefont}|{encoding}|".encode())
+    kind, value = doc.xref_get_key(xref, "ToUnicode")
+    if kind == "xref":
+        digest.update(doc.xref_stream(int(value.split()[0])) or b"")
+    return digest.hexdigest()
+
+
+def _pack(value):
+    return zlib.compress(json.dumps(value, separators=(",", ":")).encode())
+
+
+def _unpack(blob):
+    return json.loads(zlib.decompress(blob))
+
+
+class PageCache:
+    """
+    SQLite store for per-page results, compressed as JSON:
+
+    - `page_lines`: a page's extracted text lines, keyed by page fingerprint.
+    - `page_partials`: a page's `PartialParser` result, keyed by `partial_key`.
+
+    Entries not used recently are evicted beyond `max_entries` per table, except
+    for the lines of pages in a report's manifest (`store_manifest`): they are
+    the report's raw text layer, kept so it can be re-parsed without the PDF.
+    """
+
+    def __init__(self, path=PAGE_CACHE_PATH, max_entries=PAGE_CACHE_MAX_ENTRIES):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(MANIFEST_SQL)
+        for table in TABLES:
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, data BLOB NOT NULL, used_at REAL NOT NULL)"
+            )
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_used ON {table} (used_at)")
+
+    def close(self):
+        self.conn.close()
+
+    def get(self, table, keys):
+        """
+        Return `{key: value}` for the keys found in `table`, marking them as used.
+        """
+        keys = list(keys)
+        found = {}
+        for start in range(0, len(keys), 500):  # Stay under SQLite's bound parameter limit
+            batch = keys[start:start + 500]
+            query = f"SELECT key, data FROM {table} WHERE key IN ({', '.join('?' * len(batch))})"
+            found.update((key, _unpack(data)) for key, data in self.conn.execute(query, batch))
+
+        if found:
+            with self.conn:
+                now = time.time()
+                self.conn.executemany(f"UPDATE {table} SET used_at = ? WHERE key = ?", ((now, key) for key in found))
+        return found
+
+    def put(self, table, items):
+        """
+        Store `{key: value}` in `table`, then evict the least recently used entries.
+        """
+        if not items:
+            return
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?)",
+                ((key, _pack(value), now) for key, value in items.items()),
+            )
+            self.conn.execute(
+                f"DELETE FROM {table} WHERE key IN "
+                f"(SELECT key FROM {table} ORDER BY used_at DESC LIMIT -1 OFFSET ?)"
+                + (" AND key NOT IN (SELECT fingerprint FROM report_pages)" if table == "page_lines" else ""),
+                (self.max_entries,),
+            )
+
+    def store_manifest(self, digest, fingerprints, parser_version, file_name=None):
+        """
+        Record a report's pages (whose lines must already be stored) and the
+        parser version its parsed results come from.
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM reports WHERE digest = ?", (digest,))
+            self.conn.execute(
+                "INSERT INTO reports VALUES (?, ?, ?, ?, ?)",
+                (digest, file_name, len(fingerprints), parser_version, time.time()),
+            )
+            self.conn.executemany(
+                "INSERT INTO report_pages VALUES (?, ?, ?)",
+                ((digest, number, fingerprint) for number, fingerprint in enumerate(fingerprints)),
+            )
+
+    def manifests(self, stale_for=None):
+        """
+        Return `(digest, file_name, parser_version)` of every report with a stored
+        text layer, oldest first; only those parsed with another version than
+        `stale_for` when given.
+        """
+        query = "SELECT digest, file_name, parser_version FROM reports"
+        params = ()
+        if stale_for is not None:
+            query += " WHERE parser_version != ?"
+            params = (stale_for,)
+        return self.conn.execute(query + " ORDER BY stored_at", params).fetchall()
+
+    def report_lines(self, digest):
+        """
+        Return a report's text layer as one list of lines per page, or None when
+        the report has no manifest.
+        """
+        fingerprints = [
+            row[0] for row in self.conn.execute(
+                "SELECT fingerprint FROM report_pages WHERE digest = ? ORDER BY page_number", (digest,)
+            )
+        ]
+        if not fingerprints:
+            return None
+        lines = self.get("page_lines", set(fingerprints))
+        return [lines[fingerprint] for fingerprint in fingerprints]
+
+    def stamp(self, digest, parser_version):
+        """
+        Record that a report's parsed results now come from `parser_version`.
+        """
+        with self.conn:
+            self.conn.execute("UPDATE reports SET parser_version = ? WHERE digest = ?", (parser_version, digest))
+
+
+def partial_key(fingerprint, headers_seen, before, after, parser_version):
+    """
+    Cache key of a page's partial parse: the page's own lines (its fingerprint,
+    and whether header dedupe already saw the column headers) plus the context
+    lines the parser looks at on either side, and the parser version.
+    """
+    context = json.dumps([before, after], separators=(",", ":"))
+    return hashlib.sha256(f"{parser_version}|{fingerprint}|{int(headers_seen)}|{context}".encode()).hexdigest()
+
+
+def missing_pages(fingerprints, page_lines):
+    """
+    Map each fingerprint without cached `page_lines` to the number of the first
+    page that has it, in page order, so each such page is extracted once.
+    """
+    missing = {}
+    for number, fingerprint in enumerate(fingerprints):
+        if fingerprint not in page_lines:
+            missing.setdefault(fingerprint, number)
+    return missing
@@ -0,0 +1,290 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from service import timing
+from service.pools import PARSE_PARALLEL_MIN_PAGES, pool_context, task_size
+from service.schema import to_frame
+
+# Bump whenever parsed output changes so cached results are not reused
+PARSER_VERSION = 3
+
+CUSTOMER_NAME_PATTERN = r"^[A-Za-z\s,.\(\)&'-]+$"
+ACCOUNT_NUMBER_PATTERN = r"^\d{3,5}$"
+ITEM_NUMBER_PATTERN = r"^\d{1,5}-[\d]+$"  # Allow up to 5 digits before "-"
+
+logger = logging.getLogger(__name__)
+
+
+def classify_lines(content):
+    """
+    Classify every extracted line in one vectorized pass over the column.
+
+    Returns a DataFrame aligned with `content` holding the stripped text, the
+    comma-free item number candidate and boolean flags for customer, account,
+    item-number and price lines.
+    """
+    text = content.str.strip()
+    item_number = text.str.replace(",", "", regex=False)
+
+    is_name = text.str.match(CUSTOMER_NAME_PATTERN).to_numpy(dtype=bool)
+    is_account = text.str.match(ACCOUNT_NUMBER_PATTERN).to_numpy(dtype=bool)
+
+    # A customer is a name line immediately followed by an account number
+    next_is_account = np.zeros(len(text), dtype=bool)
+    next_is_account[:-1] = is_account[1:]
+    is_customer = is_name & next_is_account
+
+    # Name-like lines never fall through to item detection
+    is_item = ~is_name & item_number.str.match(ITEM_NUMBER_PATTERN).to_numpy(dtype=bool)
+
+    return pd.DataFrame({
+        "Text": text.to_numpy(),
+        "Item Number": item_number.to_numpy(),
+        "Is Customer": is_customer,
+        "Is Account": is_account,
+        "Is Item": is_item,
+        "Is Price": text.str.contains("$", regex=False).to_numpy(dtype=bool),
+    })
+
+
+class LineParser:
+    """
+    Incremental customer-assignment state machine.
+
+    Lines are fed in chunks (e.g. one PDF page at a time). Only the look-behind
+    and look-ahead lines needed to finish a chunk are kept between calls, so
+    memory stays proportional to a chunk rather than the whole report.
+
+    `stats` counts the items parsed and items that failed to parse, `customers`
+    holds the distinct `(customer, account)` pairs seen.
+    """
+
+    LOOK_BEHIND = 1  # Item Name appears before Item Number
+    LOOK_AHEAD = 2  # Price and Date Sold appear after Item Number
+
+    def __init__(self):
+        self.product_data = []  # Store items until assigned
+        self.current_customer = None
+        self.current_account = None
+        self.customers = set()
+        self.stats = {"items": 0, "parse_errors": 0}
+        self._rows = []
+        self._buffer = []
+        self._start = 0  # First buffered line not parsed yet
+
+    def feed(self, lines):
+        """
+        Buffer `lines`, parse every line whose look-ahead is available and
+        return the rows completed so far.
+        """
+        self._buffer.extend(lines)
+        self._parse(len(self._buffer) - self.LOOK_AHEAD)
+        return self._drain()
+
+    def close(self):
+        """
+        Parse the remaining buffered lines, assign the last batch of items and
+        return the final rows.
+        """
+        self._parse(len(self._buffer))
+
+        # **Store the last batch of customer data**
+        self._assign_items()
+
+        logger.info(
+            "Parsed %d items for %d customers (%d parse errors)",
+            self.stats["items"], len(self.customers), self.stats["parse_errors"],
+        )
+        return self._drain()
+
+    def feed_partial(self, leading, segments, parse_errors=0):
+        """
+        Replay a chunk parsed by `PartialParser` and return the rows completed so far.
+        """
+        self.stats["parse_errors"] += parse_errors
+        for item in leading:
+            self._on_item(item)
+        for customer, account, items in segments:
+            self._on_customer(customer, account)
+            for item in items:
+                self._on_item(item)
+        return self._drain()
+
+    def _drain(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def _assign_items(self):
+        if self.current_customer and self.current_account and self.product_data:
+            for item in self.product_data:
+                self._rows.append([self.current_customer, self.current_account] + item)
+            self.product_data = []
+
+    def _on_customer(self, customer, account):
+        # Assign items to the previous customer before changing
+        self._assign_items()
+
+        self.current_customer = customer
+        self.current_account = account
+        self.customers.add((customer, account))
+
+    def _on_item(self, item):
+        # Store item but do not assign yet
+        self.product_data.append(item)
+        self.stats["items"] += 1
+
+    def _parse(self, stop):
+        if stop <= self._start:
+            return
+
+        classified = classify_lines(pd.Series(self._buffer, dtype=object))
+        lines = classified["Text"].tolist()
+        item_numbers = classified["Item Number"].tolist()
+        is_customer = classified["Is Customer"].to_numpy()
+        is_price = classified["Is Price"].to_numpy()
+        matched = (is_customer | classified["Is Item"].to_numpy())[self._start:stop]
+        debug = logger.isEnabledFor(logging.DEBUG)  # Checked once, not per line
+
+        for idx in (np.flatnonzero(matched) + self._start).tolist():
+            # **Step 1: Detect customers BEFORE processing items**
+            if is_customer[idx]:
+                self._on_customer(lines[idx], lines[idx + 1])
+                if debug:
+                    logger.debug("Detected customer: %s, account: %s", lines[idx], lines[idx + 1])
+                continue
+
+            # **Step 2: Detect item numbers and store them**
+            item_number = item_numbers[idx]
+            try:
+                item_name = lines[idx - 1]  # Item Name appears before Item Number
+                price_line = lines[idx + 1]  # Price is after Item Number
+                price = float(price_line.replace("$", "").replace(",", "")) if is_price[idx + 1] else None
+                date_sold = lines[idx + 2]  # Date Sold appears after Price
+
+                self._on_item([item_name, item_number, price, date_sold])
+                if debug:
+                    logger.debug(
+                        "Parsed item - name: %s, number: %s, price: %s, date: %s",
+                        item_name, item_number, price, date_sold,
+                    )
+
+            except Exception as e:
+                self.stats["parse_errors"] += 1
+                if debug:
+                    logger.debug("Error processing item %s: %s", item_number, e)
+
+        # Keep only the look-behind for the next chunk
+        drop = max(stop - self.LOOK_BEHIND, 0)
+        del self._buffer[:drop]
+        self._start = stop - drop
+
+
+class PartialParser(LineParser):
+    """
+    Parses one chunk of a report independently of the chunks before it.
+
+    Items seen before the chunk's first customer stay open in `leading`, since
+    they belong to whichever customer was current when the chunk started. Every
+    customer detected in the chunk becomes a `(customer, account, items)`
+    segment. `LineParser.feed_partial` stitches the chunks back together in order.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.leading = []
+        self.segments = []
+
+    def parse(self, lines, before=(), after=()):
+        """
+        Parse `lines`, using `before` and `after` only as look-behind and
+        look-ahead context. Returns `(leading, segments, parse_errors)`.
+        """
+        self._buffer = [*before, *lines, *after]
+        self._start = len(before)
+        self._parse(len(before) + len(lines))
+        return self.leading, self.segments, self.stats["parse_errors"]
+
+    def _on_customer(self, customer, account):
+        self.segments.append((customer, account, []))
+
+    def _on_item(self, item):
+        (self.segments[-1][2] if self.segments else self.leading).append(item)
+
+
+def parse_lines(content):
+    """
+    Parse a column of extracted lines into one row per sold item.
+
+    Lines are classified up front, then the customer-assignment state machine
+    only visits the customer and item-number lines.
+    """
+    parser = LineParser()
+    rows = parser.feed(content.tolist()) + parser.close()
+    return to_frame(rows)
+
+
+@timing.timed("Parsing")
+def parse_pages(pages, workers=None):
+    """
+    Parse header-deduped pages (one list of lines per page) into one row per sold item.
+
+    Large reports are split into chunks of pages parsed in a process pool, then
+    stitched in page order so items spilling over a page boundary still reach
+    the right customer. Small reports are parsed serially.
+    """
+    workers = workers or os.cpu_count() or 1
+    all_lines = [line for lines in pages for line in lines]
+
+    if workers <= 1 or len(pages) < PARSE_PARALLEL_MIN_PAGES:
+        parser = LineParser()
+        rows = parser.feed(all_lines) + parser.close()
+        return to_frame(rows)
+
+    # Chunk boundaries fall on page boundaries
+    offsets = np.cumsum([0] + [len(lines) for lines in pages]).tolist()
+    pages_per_task = task_size(len(pages), workers)
+    bounds = [offsets[page] for page in range(0, len(pages), pages_per_task)] + [offsets[-1]]
+
+    chunks = [(all_lines[start:stop], *chunk_context(all_lines, start, stop)) for start, stop in zip(bounds, bounds[1:])]
+
+    parser = LineParser()
+    rows = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=pool_context()) as pool:
+        for partial in pool.map(_parse_chunk, chunks):
+            rows += parser.feed_partial(*partial)
+    rows += parser.close()
+
+    return to_frame(rows)
+
+
+def chunk_context(all_lines, start, stop):
+    """
+    The `(before, after)` context lines `PartialParser` needs to parse
+    `all_lines[start:stop]` as it would be parsed within all the lines.
+    """
+    # The first line's look-behind wraps to the last line, as in `parse_lines`
+    before = all_lines[start - LineParser.LOOK_BEHIND:start] if start else all_lines[-LineParser.LOOK_BEHIND:]
+    return before, all_lines[stop:stop + LineParser.LOOK_AHEAD]
+
+
+def parse_partials(chunks, workers=None):
+    """
+    Parse `(lines, before, after)` chunks independently with `PartialParser`, in a
+    process pool when there are many. Returns one partial per chunk, in order.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(chunks) < PARSE_PARALLEL_MIN_PAGES:
+        return [_parse_chunk(chunk) for chunk in chunks]
+
+    chunksize = task_size(len(chunks), workers)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context()) as pool:
+        return list(pool.map(_parse_chunk, chunks, chunksize=chunksize))
+
+
+def _parse_chunk(chunk):
+    lines, before, after = chunk
+    return PartialParser().parse(lines, before, after)
@@ -0,0 +1,26 @@
+import math
+import multiprocessing
+
+# Below these page counts, process pool startup costs more than it saves. Extracting
+# a page costs more than parsing it, so extraction goes parallel sooner.
+EXTRACT_PARALLEL_MIN_PAGES = 50
+PARSE_PARALLEL_MIN_PAGES = 200
+TASKS_PER_WORKER = 4  # Smaller tasks keep workers evenly loaded
+
+# Forking a process with other threads running (the app's) can copy their held locks into the workers
+POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def task_size(count, workers):
+    """
+    Items per pool task, splitting `count` items into about `TASKS_PER_WORKER` tasks per worker.
+    """
+    return math.ceil(count / (workers * TASKS_PER_WORKER))
+
+
+def pool_context():
+    """
+    Multiprocessing context for process pools created from a multi-threaded
+    process such as the app, whose workers must not be plain forks of it.
+    """
+    return multiprocessing.get_context(POOL_START_METHOD)
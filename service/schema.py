@@ -0,0 +1,116 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Canonical processed-data schema. Names repeat heavily across a report, so they are
+# categorical; prices are exact integer cents (missing when the line had no "$").
+SCHEMA = {
+    "Crafter Name": "category",
+    "Account Number": "int32",
+    "Item Name": "category",
+    "Item Number": "category",
+    "Price Cents": "Int64",
+    "Date Sold": "datetime64[ns]",
+}
+COLUMNS = list(SCHEMA)
+ROW_FIELDS = ["Crafter Name", "Account Number", "Item Name", "Item Number", "Price", "Date Sold"]
+CATEGORICAL_COLUMNS = [column for column, dtype in SCHEMA.items() if dtype == "category"]
+# Added when several reports are merged: the uploaded file and content digest of each row's report
+PROVENANCE_COLUMNS = ["Source File", "Source Digest"]
+
+# Tried in order when detecting the report's date format; earlier formats win ties
+DATE_FORMATS = ["%m/%d/%Y", "%m/%d/%y", "%Y-%m-%d", "%b %d, %Y", "%B %d, %Y"]
+
+
+def detect_date_format(values):
+    """
+    Return the format in `DATE_FORMATS` that parses the most of `values`, or None
+    when none of them parses any. It depends on `values` alone, so concurrent
+    sessions parsing different reports cannot affect each other.
+    """
+    best_format, best_count = None, 0
+    for date_format in DATE_FORMATS:
+        count = pd.to_datetime(values, format=date_format, errors="coerce").notna().sum()
+        if count > best_count:
+            best_format, best_count = date_format, count
+        if count == len(values):
+            break
+    return best_format
+
+
+def parse_dates(values):
+    """
+    Parse date strings to `datetime64[ns]`, parsing each distinct string only once.
+
+    Report dates repeat heavily, so the distinct strings are parsed with the
+    detected format (falling back to pandas' inference) and mapped back by code.
+    Unparseable dates, and dates outside the nanosecond range, become NaT.
+    """
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    uniques = pd.Series(uniques, dtype=object)
+
+    date_format = detect_date_format(uniques) if len(uniques) else None
+    parsed = pd.to_datetime(uniques, format=date_format, errors="coerce")
+    parsed = parsed.where((parsed >= pd.Timestamp.min) & (parsed <= pd.Timestamp.max))
+    parsed = parsed.astype("datetime64[ns]").to_numpy()
+
+    # Code -1 marks missing values and picks the NaT appended after the uniques
+    lookup = np.append(parsed, np.datetime64("NaT", "ns"))
+    return pd.Series(lookup[codes], dtype="datetime64[ns]")
+
+
+def to_frame(rows):
+    """
+    Build a typed DataFrame from parsed rows (`ROW_FIELDS`, with price in dollars
+    and the date as the report's text).
+    """
+    raw = pd.DataFrame(rows, columns=ROW_FIELDS, dtype=object)
+
+    prices = pd.to_numeric(raw["Price"], errors="coerce").astype("float64").to_numpy()
+    prices = np.where(np.isfinite(prices), np.round(prices * 100), np.nan)
+
+    return pd.DataFrame({
+        "Crafter Name": raw["Crafter Name"].astype("category"),
+        "Account Number": raw["Account Number"].astype("int64").astype("int32"),
+        "Item Name": raw["Item Name"].astype("category"),
+        "Item Number": raw["Item Number"].astype("category"),
+        "Price Cents": pd.array(prices, dtype="Float64").astype("Int64"),
+        "Date Sold": parse_dates(raw["Date Sold"]),
+    })
+
+
+def concat_frames(frames):
+    """
+    Concatenate typed frames (e.g. streamed batches), keeping categorical columns
+    categorical even when the batches saw different categories.
+    """
+    frames = [frame for frame in frames if not frame.empty] or [to_frame([])]
+    combined = pd.concat(frames, ignore_index=True)
+
+    for column in CATEGORICAL_COLUMNS:
+        combined[column] = union_categoricals([frame[column] for frame in frames], sort_categories=True)
+    return combined
+
+
+def merge_reports(reports):
+    """
+    Merge processed reports, given as `(file_name, digest, df)`, into one typed
+    frame with `PROVENANCE_COLUMNS` recording each row's report.
+
+    The merged frame's `source_key` combines the reports' keys, so downstream
+    caches (e.g. aggregates) key on the exact set of reports; it has none when
+    one of the reports has none (e.g. rows still being parsed).
+    """
+    reports = list(reports)
+    merged = concat_frames([df for _, _, df in reports])
+
+    repeats = [len(df) for _, _, df in reports]
+    for column, values in zip(PROVENANCE_COLUMNS, zip(*[(name, digest) for name, digest, _ in reports])):
+        merged[column] = pd.Categorical(np.repeat(values, repeats), categories=list(dict.fromkeys(values)))
+
+    keys = [df.attrs.get("source_key") for _, _, df in reports]
+    if all(keys):
+        merged.attrs["source_key"] = hashlib.sha256("|".join(keys).encode()).hexdigest()
+    return merged
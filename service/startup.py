@@ -0,0 +1,90 @@
+import argparse
+import re
+import subprocess
+import sys
+
+STARTUP_MODULE = "streamlit_app"
+# Heavy modules that must only be imported at first use, never on the app's start-up path
+LAZY_MODULES = ("matplotlib", "plotly.express", "fitz", "pymupdf", "kaleido")
+
+_IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def measure_imports(module=STARTUP_MODULE):
+    """
+    Import `module` in a fresh interpreter under `-X importtime` and return one
+    record per imported module: name, nesting depth, self and cumulative ms.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+    )
+
+    records = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            records.append({
+                "module": name,
+                "depth": len(indent) // 2,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+            })
+    return records
+
+
+def eager_lazy_modules(records, lazy_modules=LAZY_MODULES):
+    """
+    Return the modules in `records` that should have been imported lazily.
+    """
+    imported = {record["module"] for record in records}
+    return [
+        lazy for lazy in lazy_modules
+        if any(module == lazy or module.startswith(f"{lazy}.") for module in imported)
+    ]
+
+
+def direct_imports(records, module=STARTUP_MODULE):
+    """
+    Return the record of `module` followed by the records of the modules it imports directly.
+    """
+    # -X importtime lists a module after everything it imports, so its direct imports are
+    # the depth-1 records between it and the previous top-level record
+    end = max(index for index, record in enumerate(records) if record["module"] == module)
+    start = end
+    while start > 0 and records[start - 1]["depth"] > 0:
+        start -= 1
+    return [records[end]] + [record for record in records[start:end] if record["depth"] == 1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report the app's start-up import time per module.")
+    parser.add_argument("--module", default=STARTUP_MODULE, help="Module to import (default: %(default)s)")
+    parser.add_argument("--top", type=int, default=20, help="Number of slowest direct imports to list")
+    parser.add_argument("--budget-ms", type=float, help="Fail when the total import time exceeds this")
+    args = parser.parse_args(argv)
+
+    records = measure_imports(args.module)
+    direct = direct_imports(records, args.module)
+    total_ms = direct[0]["cumulative_ms"]
+
+    print(f"{'Module':<40} {'Self (ms)':>10} {'Cumulative (ms)':>16}")
+    for record in sorted(direct, key=lambda record: record["cumulative_ms"], reverse=True)[:args.top]:
+        print(f"{record['module']:<40} {record['self_ms']:>10.1f} {record['cumulative_ms']:>16.1f}")
+
+    failures = []
+    eager = eager_lazy_modules(records)
+    if eager:
+        failures.append(f"Imported at start-up but should be lazy: {', '.join(eager)}")
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        failures.append(f"Start-up imports took {total_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+
+    print(f"\nTotal: {total_ms:.1f} ms importing {args.module}")
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+TIMING_LOG = os.environ.get("BWE_TIMING_LOG", ".cache/timings.jsonl")  # Empty disables the log
+
+logger = logging.getLogger(__name__)
+_local = threading.local()  # Streamlit runs each session's script in its own thread
+
+
+def _spans():
+    if not hasattr(_local, "spans"):
+        _local.spans = []
+    return _local.spans
+
+
+@contextmanager
+def span(stage, rows=None):
+    """
+    Time a pipeline stage. Yields the span record, so callers can set
+    `record["rows"]` once the stage's output size is known.
+
+    CPU time is for the whole process, so work done in pool workers shows up
+    as wall time only.
+    """
+    record = {"stage": stage, "rows": rows}
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield record
+    finally:
+        record["wall_ms"] = round((time.perf_counter() - wall_start) * 1000, 2)
+        record["cpu_ms"] = round((time.process_time() - cpu_start) * 1000, 2)
+        _spans().append(record)
+
+
+def timed(stage):
+    """
+    Decorator form of `span`. The row count is taken from the result's length when it has one.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage) as record:
+                result = func(*args, **kwargs)
+                if hasattr(result, "__len__"):
+                    record["rows"] = len(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def collect():
+    """
+    Return the spans recorded in this thread since the last call, and clear them.
+    """
+    spans = list(_spans())
+    _spans().clear()
+    return spans
+
+
+def write_log(spans, path=TIMING_LOG, **context):
+    """
+    Append one JSON line per span to `path`, tagged with a timestamp and `context`
+    (e.g. file name and size) for trend analysis.
+    """
+    if not path or not spans:
+        return
+
+    timestamp = datetime.now(timezone.utc).isoformat()
+    try:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as log:
+            for record in spans:
+                log.write(json.dumps({"timestamp": timestamp, **context, **record}) + "\n")
+    except OSError as e:
+        logger.warning("Could not write timing log: %s", e)
@@ -1,49 +1,15 @@
-import matplotlib.pyplot as plt
-import matplotlib.cm as cm
-import matplotlib.dates as mdates
 import pandas as pd
 import streamlit as st
-import plotly.express as px
-import plotly.io as pio
-import io
-
-
-def categorize_account(account_number):
-    try:
-        num = int(account_number)
-    except:
-        return "Unknown"
-
-    if num >= 1000:
-        return "Wholesale"
-    elif 100 <= num < 200:
-        return "Food"
-    elif 200 <= num < 300:
-        return "Stationery/Jewelry/Accessories"
-    elif 300 <= num < 400:
-        return "Home/Linens"
-    elif 400 <= num < 500:
-        return "Toys"
-    elif 500 <= num < 600:
-        return "Clothing/Children’s"
-    elif 600 <= num < 700:
-        return "Sweaters/Knits"
-    elif 700 <= num < 800:
-        return "Holiday"
-    elif 800 <= num < 900:
-        return "Wood Items/Toys"
-    elif 900 <= num < 1000:
-        return "Former Consignor Items"
-    else:
-        return "Unknown"
-
-
-def plot_donut_chart(account_total_cost):
-    df = account_total_cost.reset_index()
-    df.columns = ["Account", "Total_Cost"]
-    df["Category"] = df["Account"].apply(categorize_account)
-
-    category_summary = df.groupby("Category")["Total_Cost"].sum().reset_index()
+
+from service import export, timing
+
+# plotly.express is imported inside the plot functions: it is slow to import and only
+# needed once there is a chart to draw, so the app paints its first page without it.
+
+
+@timing.timed("Donut chart")
+def plot_donut_chart(category_summary, download=True):
+    import plotly.express as px
 
     fig = px.pie(
         category_summary,
@@ -61,18 +27,15 @@ def plot_donut_chart(account_total_cost):
     fig.update_layout(width=600, height=500)
     st.plotly_chart(fig, use_container_width=True)
 
-    # PNG Download
-    buf = io.BytesIO()
-    pio.write_image(fig, buf, format='png')
-    st.download_button(
-        label="Download Chart as PNG",
-        data=buf.getvalue(),
-        file_name="donut_chart.png",
-        mime="image/png"
-    )
+    if download:
+        download_png_button(fig, "donut_chart.png", "Donut chart PNG export")
+    return fig
+
 
+@timing.timed("Bar chart")
+def plot_bar_chart(item_sales, download=True):
+    import plotly.express as px
 
-def plot_bar_chart(item_sales):
     # Sort by total cost for height, but color by quantity sold
     item_sales = item_sales.sort_values(by="Total_Cost", ascending=False)
 
@@ -104,19 +67,16 @@ def plot_bar_chart(item_sales):
 
     st.plotly_chart(fig, use_container_width=True)
 
-    # PNG download
-    buf = io.BytesIO()
-    pio.write_image(fig, buf, format="png")
-    st.download_button(
-        label="Download Chart as PNG",
-        data=buf.getvalue(),
-        file_name="item_sales_chart.png",
-        mime="image/png"
-    )
+    if download:
+        download_png_button(fig, "item_sales_chart.png", "Bar chart PNG export")
+    return fig
+
 
 
+@timing.timed("Sales over time chart")
+def plot_sales_over_time(sales_over_time, download=True):
+    import plotly.express as px
 
-def plot_sales_over_time(sales_over_time):
     fig = px.line(
         sales_over_time.reset_index(),
         x="Date Sold",
@@ -145,29 +105,16 @@ def plot_sales_over_time(sales_over_time):
 
     st.plotly_chart(fig, use_container_width=True)
 
-    # PNG Download
-    buf = io.BytesIO()
-    pio.write_image(fig, buf, format="png")
-    st.download_button(
-        label="Download Chart as PNG",
-        data=buf.getvalue(),
-        file_name="sales_over_time_chart.png",
-        mime="image/png"
-    )
+    if download:
+        download_png_button(fig, "sales_over_time_chart.png", "Sales over time chart PNG export")
+    return fig
 
 
-def plot_crafter_bubble_chart(processed_df, top_n=20):
-    crafter_stats = (
-        processed_df.groupby("Crafter Name")
-        .agg(
-            Total_Sales=("Price", "sum"),
-            Quantity_Sold=("Item Name", "count"),
-            Avg_Price=("Price", "mean")
-        )
-        .reset_index()
-        .sort_values("Total_Sales", ascending=False)
-        .head(top_n)
-    )
+@timing.timed("Crafter bubble chart")
+def plot_crafter_bubble_chart(crafter_stats, top_n=20, download=True):
+    import plotly.express as px
+
+    crafter_stats = crafter_stats.head(top_n)  # Already sorted by total sales
 
     fig = px.scatter(
         crafter_stats,
@@ -196,12 +143,46 @@ def plot_crafter_bubble_chart(processed_df, top_n=20):
 
     st.plotly_chart(fig, use_container_width=True)
 
-    buf = io.BytesIO()
-    pio.write_image(fig, buf, format="png")
+    if download:
+        download_png_button(fig, "crafter_bubble_chart.png", "Crafter bubble chart PNG export")
+    return fig
+
+
+def download_png_button(fig, file_name, stage):
+    """
+    Offer the figure as a PNG download. Rendering through kaleido is slow, so it
+    only happens once the user asks for it; the image is then cached by figure
+    content and the download button shows directly on later reruns.
+    """
+    digest = export.figure_digest(fig)
+    image = export.cached_png(digest)
+    slot = st.empty()  # The download button takes the prepare button's place
+
+    if image is None and slot.button("Prepare PNG download", key=f"prepare_{file_name}"):
+        image = export.render_png(fig, digest, stage)
+
+    if image is not None:
+        slot.download_button(
+            label="Download Chart as PNG",
+            data=image,
+            file_name=file_name,
+            mime="image/png"
+        )
 
-    st.download_button(
-        label="Download Chart as PNG",
-        data=buf.getvalue(),
-        file_name="crafter_bubble_chart.png",
-        mime="image/png"
-    )
+
+def download_zip_button(figures):
+    """
+    Offer every chart in `{file name: figure}` as one ZIP of PNGs, rendered in a
+    single concurrent batch once the user asks for it.
+    """
+    # Once every chart is rendered, building the archive from cached images is cheap
+    ready = all(export.cached_png(export.figure_digest(fig)) is not None for fig in figures.values())
+    slot = st.empty()
+
+    if ready or slot.button("Prepare all charts (ZIP)", key="prepare_charts_zip"):
+        slot.download_button(
+            label="Download all charts (ZIP)",
+            data=export.zip_pngs(figures),
+            file_name="charts.zip",
+            mime="application/zip"
+        )
@@ -0,0 +1,239 @@
+import hashlib
+import logging
+import os
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from service import timing
+from service.schema import COLUMNS
+
+WAREHOUSE_PATH = Path(os.environ.get("BWE_WAREHOUSE", "data/warehouse.sqlite"))
+BUSY_TIMEOUT = 60  # Seconds to wait for another writer (e.g. a parallel ingest worker)
+
+# Column name in the processed frame -> column in the sales table
+SALES_COLUMNS = {
+    "Crafter Name": "crafter_name",
+    "Account Number": "account_number",
+    "Item Name": "item_name",
+    "Item Number": "item_number",
+    "Price Cents": "price_cents",
+    "Date Sold": "date_sold",
+}
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS reports (
+    report_key TEXT PRIMARY KEY,
+    file_name TEXT,
+    row_count INTEGER NOT NULL,
+    ingested_at TEXT NOT NULL,
+    deduped INTEGER NOT NULL DEFAULT 0  -- Stored with dedupe, so replays dedupe it too
+);
+CREATE TABLE IF NOT EXISTS sales (
+    report_key TEXT NOT NULL REFERENCES reports (report_key) ON DELETE CASCADE,
+    crafter_name TEXT,
+    account_number INTEGER NOT NULL,
+    item_name TEXT,
+    item_number TEXT,
+    price_cents INTEGER,
+    date_sold TEXT,  -- ISO date, so text ranges are date ranges
+    sale_hash INTEGER  -- See sale_hashes()
+);
+CREATE INDEX IF NOT EXISTS sales_report ON sales (report_key);
+CREATE INDEX IF NOT EXISTS sales_account ON sales (account_number);
+CREATE INDEX IF NOT EXISTS sales_crafter ON sales (crafter_name);
+CREATE INDEX IF NOT EXISTS sales_item ON sales (item_number);
+CREATE INDEX IF NOT EXISTS sales_date ON sales (date_sold);
+"""
+HASH_INDEX_SQL = "CREATE INDEX IF NOT EXISTS sales_hash ON sales (sale_hash)"
+
+# Fields that identify a sale across overlapping reports
+SALE_KEY_COLUMNS = ["Account Number", "Item Number", "Price Cents", "Date Sold"]
+
+logger = logging.getLogger(__name__)
+
+
+def connect(path=WAREHOUSE_PATH):
+    """
+    Open the warehouse, creating its tables and indexes on first use.
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    conn.execute("PRAGMA journal_mode=WAL")  # Readers are not blocked while a report is stored
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(SCHEMA_SQL)
+
+    # Warehouses created before row-level dedupe lack the hash column and the flag
+    if "sale_hash" not in {row[1] for row in conn.execute("PRAGMA table_info(sales)")}:
+        conn.execute("ALTER TABLE sales ADD COLUMN sale_hash INTEGER")
+    if "deduped" not in {row[1] for row in conn.execute("PRAGMA table_info(reports)")}:
+        conn.execute("ALTER TABLE reports ADD COLUMN deduped INTEGER NOT NULL DEFAULT 0")
+    conn.execute(HASH_INDEX_SQL)
+    return conn
+
+
+def has_report(conn, key):
+    """
+    Whether the report with content key `key` is already stored.
+    """
+    return conn.execute("SELECT 1 FROM reports WHERE report_key = ?", (key,)).fetchone() is not None
+
+
+def report_deduped(conn, key):
+    """
+    Whether the report with content key `key` was stored with dedupe, or None if it is not stored.
+    """
+    row = conn.execute("SELECT deduped FROM reports WHERE report_key = ?", (key,)).fetchone()
+    return None if row is None else bool(row[0])
+
+
+def delete_report(conn, key):
+    """
+    Remove a report and its sales.
+    """
+    with conn:
+        conn.execute("DELETE FROM reports WHERE report_key = ?", (key,))  # Cascades to its sales
+
+
+def store_report(conn, key, processed_df, file_name=None, dedupe=False, replaces=()):
+    """
+    Store a report's processed rows under its content key, replacing any rows
+    previously stored for the same report, and under the keys in `replaces`
+    (e.g. the report's keys for older parser versions). Returns the rows that
+    were stored.
+
+    With `dedupe`, rows whose sale hash is already in the warehouse (sales from
+    an overlapping report) are skipped, so only new sales are stored. A report
+    that is already stored is then left as is: replacing it could drop sales
+    that later overlapping reports skipped because this report had them.
+    Whether the report was deduped is stored with it (see `report_deduped`).
+    """
+    if dedupe and has_report(conn, key):
+        return processed_df.iloc[:0]
+
+    hashes = sale_hashes(processed_df)
+
+    with timing.span("Warehouse store", rows=len(processed_df)) as record, conn:
+        # Deleting first takes the write lock, so concurrent ingests cannot both
+        # see a sale as new between the hash check and the insert
+        conn.executemany(
+            "DELETE FROM reports WHERE report_key = ?", [(key,), *((old,) for old in replaces)],
+        )  # Cascades to their sales
+
+        if dedupe:
+            known = _known_hashes(conn, hashes)
+            new_rows = ~np.isin(hashes, known)
+            processed_df, hashes = processed_df[new_rows], hashes[new_rows]
+            logger.info("Skipped %d of %d rows already in the warehouse", (~new_rows).sum(), len(new_rows))
+
+        conn.execute(
+            "INSERT INTO reports (report_key, file_name, row_count, ingested_at, deduped) VALUES (?, ?, ?, ?, ?)",
+            (key, file_name, len(processed_df), datetime.now(timezone.utc).isoformat(), dedupe),
+        )
+        conn.executemany(
+            f"INSERT INTO sales (report_key, {', '.join(SALES_COLUMNS.values())}, sale_hash) "
+            f"VALUES (?{', ?' * (len(SALES_COLUMNS) + 1)})",
+            ((key, *row, sale_hash) for row, sale_hash in zip(_sql_rows(processed_df), hashes.tolist())),
+        )
+        record["rows"] = len(processed_df)
+
+    return processed_df
+
+
+def sale_hashes(processed_df):
+    """
+    Stable 64-bit hash per sale, from `SALE_KEY_COLUMNS` and the row's occurrence
+    number among identical sales in the report.
+
+    The occurrence number keeps genuine repeat sales (the same item sold twice on
+    one day) apart, while the same sale listed in two overlapping reports still
+    hashes the same.
+    """
+    keys = processed_df[SALE_KEY_COLUMNS]
+    groups = keys.groupby(SALE_KEY_COLUMNS, dropna=False, observed=True, sort=False)
+    sale_ids, occurrence = groups.ngroup().to_numpy(), groups.cumcount().to_numpy()
+
+    # Reports repeat the same sale a lot, so only each distinct sale's text is hashed
+    _, first_rows = np.unique(sale_ids, return_index=True)
+    distinct = keys.iloc[first_rows]
+    canonical = (
+        distinct["Account Number"].astype(str)
+        + "|" + distinct["Item Number"].astype(object).fillna("").astype(str)
+        + "|" + distinct["Price Cents"].astype(object).fillna("").astype(str)
+        + "|" + distinct["Date Sold"].dt.strftime("%Y-%m-%d").fillna("")
+    )
+    sale_digests = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little") for text in canonical),
+        dtype="uint64",
+        count=len(canonical),
+    )
+
+    # Mix in the occurrence number with the splitmix64 finalizer (wrapping uint64 arithmetic)
+    mixed = sale_digests[sale_ids] ^ (occurrence.astype("uint64") * np.uint64(0x9E3779B97F4A7C15))
+    mixed = (mixed ^ (mixed >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    mixed = (mixed ^ (mixed >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return (mixed ^ (mixed >> np.uint64(31))).view("int64")
+
+
+def _known_hashes(conn, hashes):
+    # Join the incoming hashes against the hash index instead of scanning stored sales
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS incoming_hashes (sale_hash INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM incoming_hashes")
+    conn.executemany("INSERT OR IGNORE INTO incoming_hashes VALUES (?)", ((value,) for value in hashes.tolist()))
+    rows = conn.execute("SELECT sale_hash FROM sales JOIN incoming_hashes USING (sale_hash)").fetchall()
+    return np.array([row[0] for row in rows], dtype="int64")
+
+
+def _sql_rows(processed_df):
+    # Plain Python values for sqlite3: None for missing, ISO text for dates
+    columns = {
+        "Crafter Name": processed_df["Crafter Name"].astype(object),
+        "Account Number": processed_df["Account Number"].astype("int64").astype(object),
+        "Item Name": processed_df["Item Name"].astype(object),
+        "Item Number": processed_df["Item Number"].astype(object),
+        "Price Cents": processed_df["Price Cents"].astype(object),
+        "Date Sold": processed_df["Date Sold"].dt.strftime("%Y-%m-%d").astype(object),
+    }
+    frame = pd.DataFrame(columns)
+    frame = frame.where(frame.notna(), None)
+    return frame.itertuples(index=False, name=None)
+
+
+def load_sales(conn, start=None, end=None, accounts=None, crafters=None, item_numbers=None):
+    """
+    Load stored sales into the canonical typed schema, filtered on the indexed
+    columns: sale dates in [start, end] (dates or ISO strings), and account
+    numbers, crafter names or item numbers in the given collections.
+    """
+    clauses, params = [], []
+    if start is not None:
+        clauses.append("date_sold >= ?")
+        params.append(pd.Timestamp(start).strftime("%Y-%m-%d"))
+    if end is not None:
+        clauses.append("date_sold <= ?")
+        params.append(pd.Timestamp(end).strftime("%Y-%m-%d"))
+    for column, values in (("account_number", accounts), ("crafter_name", crafters), ("item_number", item_numbers)):
+        if values:
+            values = list(values)
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    query = f"SELECT {', '.join(SALES_COLUMNS.values())} FROM sales{where}"
+
+    with timing.span("Warehouse query") as record:
+        raw = pd.read_sql_query(query, conn, params=params)
+        raw.columns = list(SALES_COLUMNS)
+        record["rows"] = len(raw)
+
+    return pd.DataFrame({
+        "Crafter Name": raw["Crafter Name"].astype("category"),
+        "Account Number": raw["Account Number"].astype("int32"),
+        "Item Name": raw["Item Name"].astype("category"),
+        "Item Number": raw["Item Number"].astype("category"),
+        "Price Cents": raw["Price Cents"].astype("Int64"),
+        "Date Sold": pd.to_datetime(raw["Date Sold"], format="%Y-%m-%d").astype("datetime64[ns]"),
+    })[COLUMNS]
@@ -1,10 +1,32 @@
+import logging
+import os
+from contextlib import closing
+
+import numpy as np
 import pandas as pd
 import streamlit as st
+from service import cache, export, timing, warehouse
+from service.aggregation import aggregate
 from service.ingestion import process_pdf
-from service.visualization import plot_donut_chart, plot_bar_chart, plot_sales_over_time, plot_crafter_bubble_chart
+from service.jobs import IngestJob, get_pool, wait_all
+from service.logs import configure_logging
+from service.schema import merge_reports
+from service.visualization import (
+    download_zip_button, plot_bar_chart, plot_crafter_bubble_chart, plot_donut_chart, plot_sales_over_time,
+)
+
+# In-memory result caches shared by all sessions of this server
+APP_CACHE_TTL = int(os.environ.get("BWE_APP_CACHE_TTL", 3600))  # Seconds
+APP_CACHE_ENTRIES = int(os.environ.get("BWE_APP_CACHE_ENTRIES", 8))
+JOB_POLL_SECONDS = 1.0  # How often the page refreshes while a report is processed
+PREVIEW_PAGES = int(os.environ.get("BWE_PREVIEW_PAGES", 25))  # Leading pages parsed for the preview
+
+logger = logging.getLogger(__name__)
 
 
 def main():
+    configure_logging()
+
     # Streamlit app configuration
     st.set_page_config(
         page_title="Brooklyn Women's Exchange",
@@ -14,81 +36,61 @@ def main():
 
     set_background_color()
 
+    export.get_service()  # Warms the PNG renderers in the background before anyone downloads
+
+    show_performance = st.sidebar.checkbox("Show performance", value=False)
+    timing.collect()  # Drop spans left over from an interrupted run
+
     # Header Image
     st.image("images/new-ban.png", use_container_width=True)
 
     st.title("PDF Uploader and Analysis Tool")
-    st.write("Upload a PDF file to extract, process, and visualize the data.")
+    st.write("Upload one or more PDF reports to extract, process, and visualize the data.")
 
-    uploaded_file = st.file_uploader("Upload your PDF file", type="pdf")
+    uploaded_files = st.file_uploader("Upload your PDF files", type="pdf", accept_multiple_files=True)
 
-    if uploaded_file is not None:
-        with st.spinner("Processing PDF..."):
-            processed_df = process_pdf(uploaded_file)
+    if uploaded_files:
+        with timing.span("Upload digest"):
+            uploads = {}  # Digest -> upload; a report uploaded twice is processed and counted once
+            for uploaded_file in uploaded_files:
+                uploads.setdefault(cache.source_digest(uploaded_file.getvalue()), uploaded_file)
 
-        if not isinstance(processed_df, pd.DataFrame):
-            st.error("Unexpected return type from `process_pdf`")
-        else:
-            st.success("PDF processed successfully!")
-            st.write("### Processed Data:")
-            st.dataframe(processed_df, use_container_width=True)
+        # Parsing runs in the background; until it is done, show progress and a preview
+        ingest_jobs = start_ingest_jobs(uploads)
+        if not wait_all(ingest_jobs, JOB_POLL_SECONDS):
+            show_jobs_progress(ingest_jobs)
+            show_preview(ingest_jobs, uploads)
+            wait_all(ingest_jobs, JOB_POLL_SECONDS)
+            st.rerun()
 
-            # **Step 1: Aggregate Data for Visualization**
+        reports = []
+        for job in ingest_jobs:
             try:
-                processed_df["Total Cost"] = processed_df["Price"]  # Rename for consistency
-
-                # Donut Chart: Total cost per account
-                account_total_cost = processed_df.groupby("Account Number")["Total Cost"].sum()
-
-                item_sales = processed_df.groupby("Item Number").agg(
-                    Total_Cost=("Total Cost", "sum"),
-                    Count=("Item Name", "count"),
-                    Item_Name=("Item Name", "first")
-                ).reset_index()
-
-                # Filter to only include items sold at least 3 times
-                item_sales = item_sales[item_sales["Count"] >= 3]
-
-                processed_df["Date Sold"] = pd.to_datetime(processed_df["Date Sold"], errors="coerce")
-                sales_over_time = processed_df.groupby("Date Sold")["Price"].sum().reset_index()
-                sales_over_time.columns = ["Date Sold", "Price"]
-                sales_over_time["Date Sold"] = pd.to_datetime(sales_over_time["Date Sold"])
-
-                # **Step 2: Render Charts**
-                st.write("## Visualizations")
-
-                col1, col2 = st.columns(2)
-
-                with col1:
-                    if not account_total_cost.empty:
-                        st.write("### Total Cost per Category")
-                        plot_donut_chart(account_total_cost)
-                    else:
-                        st.warning("Not enough data for donut chart.")
-
-                with col2:
-                    if not item_sales.empty:
-                        st.write("### Sales per Item")
-                        plot_bar_chart(item_sales)
-                    else:
-                        st.warning("Not enough data for bar chart.")
-
-
-
-                st.write("### Sales Over Time")
-                if not sales_over_time.empty:
-                        plot_sales_over_time(sales_over_time)
-                else:
-                        st.warning("Not enough data for time-series chart.")
-
-                st.write("### Crafter Performance")
-                plot_crafter_bubble_chart(processed_df)
+                reports.append((job.file_name, job.digest, load_report(job.digest, job)))
+            except RuntimeError as e:
+                st.error(f"Could not process {job.file_name}: {e}")
+                st.button("Retry", key=f"retry-{job.digest}", on_click=retry_ingest_job, args=(job.digest,))
+        processed_df = merge_uploads(reports) if reports else None
 
+        if not isinstance(processed_df, pd.DataFrame):
+            st.error("No report could be processed.")
+        else:
+            st.success(f"{len(reports)} PDF{'s' if len(reports) > 1 else ''} processed successfully!")
+            show_dashboard(processed_df)
 
-            except KeyError as e:
-                st.error(f"Missing expected column: {e}")
+        job_spans = [span for job in ingest_jobs for span in job.take_spans()]
+        spans = job_spans + timing.collect()
+        if job_spans:  # Jobs hand over their spans once, so later reruns of the same ingest are not logged again
+            timing.write_log(
+                spans,
+                file_name=", ".join(job.file_name for job in ingest_jobs),
+                file_size=sum(upload.size for upload in uploads.values()),
+            )
+        if show_performance:
+            show_performance_panel(spans)
 
     else:
+        start_ingest_jobs({})  # Cancels the jobs of removed uploads
         st.warning("Please upload a PDF file to proceed.")
 
     # Footer
@@ -113,6 +115,241 @@ def main():
         )
 
 
+def show_dashboard(processed_df, partial=False):
+    """
+    Shows the processed rows and the charts over them. For `partial` results the
+    charts are labelled as approximate and offer no downloads.
+    """
+    # Prices are stored as integer cents, charts and the table show dollars
+    processed_df["Price"] = processed_df["Price Cents"].astype("float64") / 100
+
+    st.write("### Processed Data (partial):" if partial else "### Processed Data:")
+    st.dataframe(processed_df.drop(columns=["Price Cents", "Source Digest"]), use_container_width=True)
+
+    # **Step 1: Aggregate Data for Visualization**
+    try:
+        key = processed_df.attrs.get("source_key")
+        # Rows still being parsed have no key and are aggregated afresh on each refresh
+        aggregates = load_aggregates(key, processed_df) if key else aggregate(processed_df)
+
+        # Filter to only include items sold at least 3 times
+        item_sales = aggregates.items[aggregates.items["Count"] >= 3]
+
+        # **Step 2: Render Charts**
+        if partial:
+            st.write("## Visualizations (partial)")
+            st.caption("Approximate charts over the pages processed so far; they are replaced when processing finishes.")
+        else:
+            st.write("## Visualizations")
+        figures = {}  # File name -> figure, for the ZIP download
+
+        col1, col2 = st.columns(2)
+
+        with col1:
+            if not aggregates.categories.empty:
+                st.write("### Total Cost per Category")
+                figures["donut_chart.png"] = plot_donut_chart(aggregates.categories, download=not partial)
+            else:
+                st.warning("Not enough data for donut chart.")
+
+        with col2:
+            if not item_sales.empty:
+                st.write("### Sales per Item")
+                figures["item_sales_chart.png"] = plot_bar_chart(item_sales, download=not partial)
+            else:
+                st.warning("Not enough data for bar chart.")
+
+
+
+        st.write("### Sales Over Time")
+        if not aggregates.days.empty:
+                figures["sales_over_time_chart.png"] = plot_sales_over_time(aggregates.days, download=not partial)
+        else:
+                st.warning("Not enough data for time-series chart.")
+
+        st.write("### Crafter Performance")
+        figures["crafter_bubble_chart.png"] = plot_crafter_bubble_chart(aggregates.crafters, download=not partial)
+
+        if not partial:
+            download_zip_button(figures)
+
+
+    except KeyError as e:
+        st.error(f"Missing expected column: {e}")
+
+
+def show_preview(ingest_jobs, uploads):
+    """
+    Shows the dashboard over what is known while jobs run: finished reports, and
+    for the others the larger of their leading-pages preview and the rows their
+    job has parsed so far.
+    """
+    reports, covered = [], []
+    for job in ingest_jobs:
+        if job.failed:
+            continue
+        if job.done:
+            reports.append((job.file_name, job.digest, job.result()))
+            continue
+
+        try:
+            partial_df = load_preview(job.digest, uploads[job.digest])
+        except RuntimeError as e:
+            logger.warning("Could not preview %s: %s", job.file_name, e)
+            continue
+        streamed_df = job.partial()
+        if len(streamed_df) > len(partial_df):
+            partial_df = streamed_df
+        reports.append((job.file_name, job.digest, partial_df))
+        if partial_df.attrs.get("page_count"):
+            covered.append(f"{job.file_name}: {partial_df.attrs['preview_pages']} of {partial_df.attrs['page_count']} pages")
+
+    if not any(len(df) for _, _, df in reports):
+        return
+
+    st.warning(
+        "Partial results while processing continues"
+        + (f" ({'; '.join(covered)})" if covered else "")
+        + ". The table and charts below will be replaced by the full results."
+    )
+    show_dashboard(merge_uploads(reports), partial=True)
+
+
+def start_ingest_jobs(uploads):
+    """
+    This session's background ingestion jobs for `{digest: upload}`, each started
+    on first sight of its upload. Jobs of uploads that were removed are cancelled.
+    Failed jobs are kept, so their error shows, until the user retries them (see
+    `retry_ingest_job`) or the upload changes.
+
+    A single report is parsed page by page with live progress; several reports
+    are parsed concurrently, one per worker of the shared process pool.
+    """
+    previous = st.session_state.get("ingest_jobs", {})
+    for digest, job in previous.items():
+        if digest not in uploads and not job.done:
+            job.cancel()
+
+    retries = st.session_state.pop("retry_ingest", set())
+    pool = get_pool() if len(uploads) > 1 else None
+    current = {}
+    for digest, uploaded_file in uploads.items():
+        job = previous.get(digest)
+        if job is None or job.cancelled or (job.failed and digest in retries):
+            job = IngestJob(uploaded_file.getvalue(), digest, uploaded_file.name, pool=pool).start()
+        current[digest] = job
+
+    st.session_state["ingest_jobs"] = current
+    return list(current.values())
+
+
+def retry_ingest_job(digest):
+    """
+    Ask `start_ingest_jobs` to restart the failed job of an upload on the next run.
+    """
+    st.session_state.setdefault("retry_ingest", set()).add(digest)
+
+
+def show_jobs_progress(ingest_jobs):
+    """
+    Shows how many reports are done with an estimate of the time left; for a
+    single report, its page-level progress instead.
+    """
+    if len(ingest_jobs) == 1:
+        show_job_progress(ingest_jobs[0])
+        return
+
+    done = [job for job in ingest_jobs if job.done and not job.failed]
+    elapsed = max(job.progress().elapsed for job in ingest_jobs)
+    rows = sum(len(job.result()) for job in done)
+
+    text = f"Processed {len(done)} of {len(ingest_jobs)} reports, {rows} rows found"
+    if done:
+        text += f", about {elapsed / len(done) * (len(ingest_jobs) - len(done)):.0f}s left"
+    st.progress(len(done) / len(ingest_jobs), text=text)
+
+
+def show_job_progress(job):
+    """
+    Shows the job's progress with an estimate of the time left.
+    """
+    progress = job.progress()
+    if progress.page_count is None:
+        st.progress(0.0, text="Reading PDF...")
+        return
+
+    text = f"Processed {progress.pages_done} of {progress.page_count} pages, {progress.rows} rows found"
+    if progress.eta is not None:
+        text += f", about {progress.eta:.0f}s left"
+    st.progress(progress.fraction, text=text)
+
+
+def merge_uploads(reports):
+    """
+    Merge the processed reports of several uploads, keeping each sale once when
+    reports overlap (the first upload listing it is its source).
+    """
+    merged = merge_reports(reports)
+    if len(reports) > 1:
+        hashes = np.concatenate([warehouse.sale_hashes(df) for _, _, df in reports])
+        repeated = pd.Series(hashes).duplicated().to_numpy()
+        if repeated.any():
+            merged = merged[~repeated].reset_index(drop=True)
+            st.info(f"Skipped {repeated.sum()} sales listed in more than one report.")
+    return merged
+
+
+@st.cache_data(ttl=APP_CACHE_TTL, max_entries=APP_CACHE_ENTRIES, show_spinner=False)
+def load_preview(digest, _uploaded_file):
+    """
+    Rows of an upload's first `PREVIEW_PAGES` pages (or its full result when
+    already cached), cached in memory by the upload's content digest.
+    """
+    return process_pdf(_uploaded_file, digest=digest, max_pages=PREVIEW_PAGES)
+
+
+@st.cache_data(ttl=APP_CACHE_TTL, max_entries=APP_CACHE_ENTRIES, show_spinner=False)
+def load_report(digest, _job):
+    """
+    Parsed rows of a finished ingestion job, cached in memory by the upload's
+    content digest so widget reruns and other sessions reuse them.
+    New sales are also kept in the SQLite warehouse for historical analysis; sales
+    that an overlapping report already stored are skipped.
+    """
+    processed_df = _job.result()
+
+    try:
+        with closing(warehouse.connect()) as conn:
+            warehouse.store_report(conn, processed_df.attrs["source_key"], processed_df, _job.file_name, dedupe=True)
+    except Exception as e:
+        # The dashboard works without history, so a warehouse failure is not fatal
+        logger.warning("Could not store %s in the warehouse: %s", _job.file_name, e)
+
+    return processed_df
+
+
+@st.cache_data(ttl=APP_CACHE_TTL, max_entries=APP_CACHE_ENTRIES, show_spinner=False)
+def load_aggregates(key, _processed_df):
+    """
+    Dashboard aggregates of the uploads, cached in memory by the merged frame's source key.
+    """
+    return aggregate(_processed_df)
+
+
+def show_performance_panel(spans):
+    """
+    Shows per-stage wall time, CPU time and row counts of this run in the sidebar.
+    """
+    st.sidebar.write("### Performance")
+    if not spans:
+        st.sidebar.info("No stages recorded for this run.")
+        return
+
+    timings = pd.DataFrame(spans, columns=["stage", "wall_ms", "cpu_ms", "rows"])
+    timings.columns = ["Stage", "Wall (ms)", "CPU (ms)", "Rows"]
+    st.sidebar.dataframe(timings, hide_index=True, use_container_width=True)
+
+
 def set_background_color():
     """
     Adds a custom background color to the Streamlit app.
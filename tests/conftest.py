@@ -0,0 +1,12 @@
+import os
+import tempfile
+
+# Point every on-disk store at a scratch directory before the service modules read their settings
+_scratch = tempfile.mkdtemp(prefix="bwe-tests-")
+os.environ.update(
+    BWE_CACHE_DIR=os.path.join(_scratch, "parsed"),
+    BWE_PAGE_CACHE=os.path.join(_scratch, "pages.sqlite"),
+    BWE_WAREHOUSE=os.path.join(_scratch, "warehouse.sqlite"),
+    BWE_DATASET_DIR=os.path.join(_scratch, "sales"),
+    BWE_TIMING_LOG="",
+)
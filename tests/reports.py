@@ -0,0 +1,86 @@
+"""
+Synthetic "Sales by Account" reports for the tests: random accounts and sales
+as extracted text lines, split into pages and written to PDFs.
+"""
+import fitz
+
+# Every page repeats the column headers, including the line header dedupe drops
+HEADER_LINES = [
+    "Customer Name Account Number Item Name Item Number Price Date Sold",
+    "NAME", "DATE", "SOLD", "ITEM #", "ITEM NAME", "PRICE", "SOLD", "ACCOUNT ", "ITEM ", "FEE ",
+]
+FIRST_NAMES = ["Betsy", "Chris", "Nina", "Silk Road", "Ann", "Maria"]
+LAST_NAMES = ["Baudille", "Sargiotto", "Parmee", "Bazaar", "O'Neil", "Smith-Jones"]
+ITEM_NAMES = ["Dark Chocolate Turtles", "Wild Jungle Floral Birthday Card", "Taxi with Chrstmas Tree", "Knit Hat"]
+LINE_HEIGHT = 12
+LINES_PER_PAGE = 60
+
+
+def report_lines(rng, customers):
+    """
+    The text lines of a report listing `customers` random accounts, and its number of items.
+    """
+    lines, item_count = [], 0
+    for _ in range(customers):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        account = rng.randrange(100, 10000)
+        lines += [name, str(account)]
+        items = rng.randrange(1, 6)
+        item_count += items
+        for _ in range(items):
+            item_number = f"{account:,}-{rng.randrange(1, 600)}"
+            date = f"1/{rng.randrange(1, 29)}/2025"
+            lines += [rng.choice(ITEM_NAMES), item_number, f"${rng.randrange(100, 5000) / 100:.2f}", date, date]
+        lines += ["TOTAL # ITEM(S)", name, str(account), str(items), "$1.00", "$0.00"]
+    return lines, item_count
+
+
+def paginate(rng, lines, headers=True):
+    """
+    Split lines into pages at random points, each page starting with the column
+    headers unless `headers` is false.
+    """
+    pages = []
+    while lines:
+        split = rng.randrange(1, LINES_PER_PAGE - len(HEADER_LINES))
+        pages.append((HEADER_LINES if headers else []) + lines[:split])
+        lines = lines[split:]
+    return pages
+
+
+def write_pdf(pages, path, forms=False):
+    """
+    Write one PDF page per list of lines. With `forms`, each page only draws a
+    Form XObject holding the page's text.
+    """
+    doc = fitz.open()
+    for lines in pages:
+        page = doc.new_page(height=(len(lines) + 2) * LINE_HEIGHT)
+        for number, line in enumerate(lines, start=1):
+            page.insert_text((36, number * LINE_HEIGHT), line, fontsize=9)
+
+    if forms:
+        wrapped = fitz.open()
+        for page in doc:
+            wrapped.new_page(width=page.rect.width, height=page.rect.height).show_pdf_page(page.rect, doc, page.number)
+        doc = wrapped
+
+    doc.save(path)
+    return path
+
+
+def sale_rows(rng, count):
+    """
+    Random rows as the parsers emit them (`schema.ROW_FIELDS`): text account
+    numbers from every category band, prices in dollars (some missing) and the
+    report's date text (some unparseable).
+    """
+    crafters = [(f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", str(rng.randrange(50, 1500))) for _ in range(30)]
+    dates = [f"1/{day}/2025" for day in range(1, 29)] + ["12/31/2024", "not a date", ""]
+    rows = []
+    for _ in range(count):
+        name, account = rng.choice(crafters)
+        price = None if rng.random() < 0.05 else rng.randrange(0, 10000) / 100
+        item_number = f"{account}-{rng.randrange(1, 40)}"
+        rows.append([name, account, rng.choice(ITEM_NAMES), item_number, price, rng.choice(dates)])
+    return rows
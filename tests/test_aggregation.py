@@ -0,0 +1,85 @@
+"""
+The bincount aggregates match the pandas groupbys the dashboard used to run
+on the plain object rows, in dollars.
+"""
+import random
+
+import pandas as pd
+import pytest
+
+from service.aggregation import aggregate
+from service.schema import ROW_FIELDS, parse_dates, to_frame
+
+from test_categories import reference_category
+
+from reports import sale_rows
+
+
+@pytest.fixture
+def rows():
+    rows = sale_rows(random.Random(11), 3000)
+    rows[0][-1] = rows[1][-1] = "not a date"
+    rows[2][4] = rows[3][4] = None
+    rows[4][2] = None  # Unnamed items are not counted
+    return rows
+
+
+@pytest.fixture
+def reference(rows):
+    df = pd.DataFrame(rows, columns=ROW_FIELDS, dtype=object)
+    df["Price"] = df["Price"].astype("float64")
+    df["Date Sold"] = parse_dates(df["Date Sold"])
+    return df
+
+
+def test_accounts_and_categories(rows, reference):
+    aggregates = aggregate(to_frame(rows))
+
+    expected = reference.groupby("Account Number")["Price"].sum()
+    actual = aggregates.accounts.set_index(aggregates.accounts["Account Number"].astype(str))
+    assert sorted(actual.index) == sorted(expected.index)
+    assert actual["Total_Cost"].to_dict() == pytest.approx(expected.to_dict())
+    assert actual["Category"].tolist() == [reference_category(account) for account in actual.index]
+
+    by_account = expected.reset_index()
+    by_account["Category"] = by_account["Account Number"].apply(reference_category)
+    expected = by_account.groupby("Category")["Price"].sum()
+    actual = aggregates.categories.set_index(aggregates.categories["Category"].astype(str))["Total_Cost"]
+    assert actual.to_dict() == pytest.approx(expected.to_dict())
+
+
+def test_items(rows, reference):
+    items = aggregate(to_frame(rows)).items
+
+    expected = reference.groupby("Item Number").agg(
+        Total_Cost=("Price", "sum"), Count=("Item Name", "count"), Item_Name=("Item Name", "first"),
+    )
+    actual = items.set_index(items["Item Number"].astype(str))
+    assert sorted(actual.index) == sorted(expected.index)
+    actual = actual.loc[expected.index]
+    assert actual["Total_Cost"].tolist() == pytest.approx(expected["Total_Cost"].tolist())
+    assert actual["Count"].tolist() == expected["Count"].tolist()
+    assert actual["Item_Name"].astype(str).tolist() == expected["Item_Name"].tolist()
+
+
+def test_days(rows, reference):
+    days = aggregate(to_frame(rows)).days
+
+    expected = reference.groupby("Date Sold")["Price"].sum()
+    assert days["Date Sold"].tolist() == expected.index.tolist()
+    assert days["Price"].tolist() == pytest.approx(expected.tolist())
+
+
+def test_crafters(rows, reference):
+    crafters = aggregate(to_frame(rows)).crafters
+
+    expected = reference.groupby("Crafter Name").agg(
+        Total_Sales=("Price", "sum"), Quantity_Sold=("Item Name", "count"), Avg_Price=("Price", "mean"),
+    )
+    assert crafters["Total_Sales"].is_monotonic_decreasing
+    actual = crafters.set_index(crafters["Crafter Name"].astype(str))
+    assert sorted(actual.index) == sorted(expected.index)
+    actual = actual.loc[expected.index]
+    for column in ["Total_Sales", "Avg_Price"]:
+        assert actual[column].tolist() == pytest.approx(expected[column].tolist(), nan_ok=True)
+    assert actual["Quantity_Sold"].tolist() == expected["Quantity_Sold"].tolist()
@@ -0,0 +1,58 @@
+"""
+The configured band table categorizes accounts as the old if-chain did.
+"""
+import pytest
+
+from service.categories import CategoryTable, categorize_accounts
+
+
+def reference_category(account_number):
+    # The per-account if-chain the band table replaced
+    try:
+        num = int(account_number)
+    except (TypeError, ValueError):
+        return "Unknown"
+
+    if num >= 1000:
+        return "Wholesale"
+    elif 100 <= num < 200:
+        return "Food"
+    elif 200 <= num < 300:
+        return "Stationery/Jewelry/Accessories"
+    elif 300 <= num < 400:
+        return "Home/Linens"
+    elif 400 <= num < 500:
+        return "Toys"
+    elif 500 <= num < 600:
+        return "Clothing/Children’s"
+    elif 600 <= num < 700:
+        return "Sweaters/Knits"
+    elif 700 <= num < 800:
+        return "Holiday"
+    elif 800 <= num < 900:
+        return "Wood Items/Toys"
+    elif 900 <= num < 1000:
+        return "Former Consignor Items"
+    else:
+        return "Unknown"
+
+
+def test_bands_match_the_if_chain():
+    accounts = list(range(-5, 2100)) + [10**9, 250.0]
+    assert categorize_accounts(accounts).tolist() == [reference_category(account) for account in accounts]
+
+
+def test_text_accounts_match_the_if_chain():
+    accounts = ["112", "0350", "999", "1000", "", "abc", "12-3", None]
+    assert categorize_accounts(accounts).tolist() == [reference_category(account) for account in accounts]
+
+
+def test_categories_are_sorted_and_include_unknown():
+    categories = categorize_accounts([112]).categories.tolist()
+    assert categories == sorted(categories)
+    assert "Unknown" in categories
+
+
+def test_overlapping_bands_are_rejected():
+    with pytest.raises(ValueError):
+        CategoryTable([{"start": 100, "stop": 200, "category": "A"}, {"start": 150, "stop": 300, "category": "B"}])
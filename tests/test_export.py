@@ -0,0 +1,48 @@
+"""
+PNG export keeps a warm kaleido renderer per export thread instead of
+rendering each figure through plotly.io's cold path.
+"""
+import threading
+
+import plotly.graph_objects as go
+import plotly.io as pio
+import pytest
+
+from service import export
+
+PlotlyScope = pytest.importorskip("kaleido.scopes.plotly").PlotlyScope
+
+
+@pytest.fixture
+def cold_path_disabled(monkeypatch):
+    def to_image(*args, **kwargs):
+        raise AssertionError("rendered through plotly.io instead of the warm renderer")
+
+    monkeypatch.setattr(pio, "to_image", to_image)
+
+
+def test_export_threads_reuse_their_renderer(cold_path_disabled):
+    scopes = []
+
+    def render_twice():
+        for value in (1, 2):
+            assert export._render(go.Figure(go.Bar(y=[value]))).startswith(b"\x89PNG")
+            scopes.append(export._renderers.scope)
+
+    thread = threading.Thread(target=render_twice)
+    thread.start()
+    thread.join()
+
+    assert len(scopes) == 2
+    assert isinstance(scopes[0], PlotlyScope)
+    assert scopes[0] is scopes[1]
+
+
+def test_service_renders_with_warm_renderers(cold_path_disabled):
+    service = export.ExportService(workers=2)
+    figs = [go.Figure(go.Bar(y=[value])) for value in range(4)]
+
+    images = service.render(figs)
+
+    assert len(images) == len(figs)
+    assert all(image.startswith(b"\x89PNG") for image in images)
@@ -0,0 +1,101 @@
+"""
+Randomized equivalence of the parse paths: a report parsed serially, in chunks
+across a process pool (`parse_pages`), and page by page through the page cache
+(`splice_page_partials`, cold and warm) must give the same rows.
+
+Reports are synthetic "Sales by Account" text with page breaks at random lines,
+so items and customers spill over page boundaries. Each is also rendered with
+every page wrapped in a Form XObject, as some PDF tools write them.
+"""
+import hashlib
+import json
+import random
+from contextlib import closing
+
+import fitz
+import pytest
+
+from service import parsing
+from service.extraction import extract_pages
+from service.ingestion import (
+    headers_seen_before, iter_unique_header_pages, parse_cached_pages, splice_page_partials, stream_cached_pages,
+)
+from service.pages import PageCache, page_fingerprints
+from service.parsing import parse_pages
+from service.schema import to_frame
+
+from reports import paginate, report_lines, write_pdf
+
+SEEDS = range(6)
+
+
+@pytest.fixture(params=[False, True], ids=["content-streams", "form-xobjects"])
+def forms(request):
+    return request.param
+
+
+@pytest.fixture
+def parallel_parsing(monkeypatch):
+    # Chunk even small reports across the pool
+    monkeypatch.setattr(parsing, "PARSE_PARALLEL_MIN_PAGES", 1)
+
+
+def streamed(source, page_cache_path):
+    return to_frame([row for _, _, rows in stream_cached_pages(source, 2, 3, page_cache_path) for row in rows])
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_line_paths_agree(tmp_path, seed, parallel_parsing):
+    # Without headers between pages, items spill straight into the next page's lines
+    rng = random.Random(seed)
+    lines, _ = report_lines(rng, customers=rng.randrange(5, 25))
+    # Starting mid-sale, at the first item's number, its look-behind wraps to the last line
+    pages = paginate(rng, lines[3:], headers=rng.random() < 0.5)
+    pages += pages[:3]  # Repeated pages share fingerprints, but not always their context
+    fingerprints = [hashlib.sha256(json.dumps(lines).encode()).hexdigest() for lines in pages]
+    headers_seen = headers_seen_before(pages)
+    deduped = list(iter_unique_header_pages(pages))
+
+    serial = parse_pages(deduped, workers=1)
+    assert parse_pages(deduped, workers=3).equals(serial)
+    with closing(PageCache(tmp_path / "pages.sqlite")) as page_cache:
+        assert splice_page_partials(deduped, fingerprints, headers_seen, page_cache, workers=1).equals(serial)  # Cold
+        assert splice_page_partials(deduped, fingerprints, headers_seen, page_cache, workers=1).equals(serial)  # Warm
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_pdf_paths_agree(tmp_path, seed, forms, parallel_parsing):
+    rng = random.Random(seed)
+    lines, item_count = report_lines(rng, customers=rng.randrange(5, 25))
+    pages = paginate(rng, lines)
+    source = write_pdf(pages, tmp_path / "report.pdf", forms)
+
+    # A later cumulative report repeats the second half of this one and adds new sales
+    half = len(pages) // 2
+    new_lines, _ = report_lines(rng, customers=5)
+    later_source = write_pdf(pages[half:] + paginate(rng, new_lines), tmp_path / "later.pdf", forms)
+
+    page_cache_path = tmp_path / "pages.sqlite"
+    for path, expected_items in ((source, item_count), (later_source, None)):
+        deduped = list(iter_unique_header_pages(extract_pages(path, workers=1)))
+        serial = parse_pages(deduped, workers=1)
+        if expected_items is not None:
+            assert len(serial) == expected_items
+
+        assert parse_pages(deduped, workers=3).equals(serial)
+        assert parse_cached_pages(path, 1, page_cache_path).equals(serial)  # Cold for `report`, warm for `later`
+        assert parse_cached_pages(path, 1, page_cache_path).equals(serial)  # Warm
+        assert streamed(path, tmp_path / f"stream-{path.stem}.sqlite").equals(serial)  # Cold
+        assert streamed(path, page_cache_path).equals(serial)  # Warm
+
+
+def test_form_pages_fingerprint_their_text(tmp_path):
+    # Wrapped pages have near-identical content streams; their forms tell them apart
+    rng = random.Random(0)
+    pages = paginate(rng, report_lines(rng, customers=10)[0])
+    source = write_pdf(pages, tmp_path / "report.pdf", forms=True)
+
+    with fitz.open(source) as doc:
+        fingerprints = page_fingerprints(doc)
+    assert None not in fingerprints
+    assert len(set(fingerprints)) == len(pages)
@@ -0,0 +1,51 @@
+"""
+The typed schema holds the same values as the parsers' plain object rows.
+"""
+import random
+
+import pandas as pd
+import pytest
+
+from service.schema import ROW_FIELDS, detect_date_format, parse_dates, to_frame
+
+from reports import sale_rows
+
+
+@pytest.fixture
+def rows():
+    return sale_rows(random.Random(3), 2000)
+
+
+def reference_date(value):
+    # One value at a time, as the row-by-row code parsed them
+    date = pd.to_datetime(value, format="%m/%d/%Y", errors="coerce")
+    return date if pd.Timestamp.min <= date <= pd.Timestamp.max else pd.NaT
+
+
+def test_to_frame_holds_the_row_values(rows):
+    raw = pd.DataFrame(rows, columns=ROW_FIELDS)
+    df = to_frame(rows)
+
+    for column in ["Crafter Name", "Item Name", "Item Number"]:
+        assert df[column].astype(object).tolist() == raw[column].tolist()
+    assert df["Account Number"].tolist() == raw["Account Number"].astype(int).tolist()
+
+    cents = [None if pd.isna(price) else round(price * 100) for price in raw["Price"]]
+    assert df["Price Cents"].astype(object).where(df["Price Cents"].notna(), None).tolist() == cents
+
+
+def test_parse_dates_matches_parsing_each_value(rows):
+    values = [row[-1] for row in rows] + [None, "13/45/2025", "1/9/3000"]
+    expected = [reference_date(value) for value in values]
+
+    parsed = parse_dates(values)
+    assert parsed.dtype == "datetime64[ns]"
+    assert parsed.tolist() == expected
+
+
+def test_date_format_depends_on_the_values_only():
+    iso, us = pd.Series(["2025-01-09", "2025-01-10"]), pd.Series(["1/9/2025", "1/10/2025"])
+    assert detect_date_format(us) == "%m/%d/%Y"
+    assert detect_date_format(iso) == "%Y-%m-%d"
+    assert detect_date_format(us) == "%m/%d/%Y"
+    assert detect_date_format(pd.Series(["no", "dates"])) is None
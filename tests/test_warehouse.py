@@ -0,0 +1,113 @@
+"""
+Row-level dedupe in the warehouse: sale hashes, storing overlapping reports,
+re-storing a report, and replaying stored reports through the parser again.
+"""
+import random
+from contextlib import closing
+
+import numpy as np
+import pytest
+
+from service import warehouse
+from service.dataset import ingest_files, read_dataset, replay_reports
+from service.ingestion import process_pdf
+from service.schema import to_frame
+
+from reports import paginate, report_lines, write_pdf
+
+SALE_1 = ["Betsy Baudille", "112", "Dark Chocolate Turtles", "112-47", 6.0, "1/9/2025"]
+SALE_2 = ["Chris Sargiotto", "350", "Knit Hat", "350-597", 4.0, "1/10/2025"]
+SALE_3 = ["Nina Parmee", "435", "Birthday Card", "435-12", 12.5, "1/11/2025"]
+UNPRICED = ["Nina Parmee", "435", "Birthday Card", "435-13", None, "not a date"]
+
+
+@pytest.fixture
+def conn(tmp_path):
+    with closing(warehouse.connect(tmp_path / "warehouse.sqlite")) as conn:
+        yield conn
+
+
+def stored_hashes(conn):
+    return sorted(row[0] for row in conn.execute("SELECT sale_hash FROM sales"))
+
+
+def test_sale_hashes_match_across_reports():
+    first = warehouse.sale_hashes(to_frame([SALE_1, SALE_2, UNPRICED]))
+    # Another report lists the same sales in another order, with other categories
+    second = warehouse.sale_hashes(to_frame([SALE_3, UNPRICED, SALE_2, SALE_1]))
+
+    assert len(set(first)) == 3
+    assert set(first) < set(second)
+
+
+def test_sale_hashes_keep_repeat_sales_apart():
+    hashes = warehouse.sale_hashes(to_frame([SALE_1, SALE_1, SALE_2]))
+    assert len(set(hashes)) == 3
+
+    # The same two sales listed again match both, a third one is new
+    again = warehouse.sale_hashes(to_frame([SALE_1, SALE_1, SALE_1]))
+    assert set(again[:2]) == set(hashes[:2])
+    assert again[2] not in set(hashes)
+
+
+def test_overlapping_reports_store_their_union_once(conn):
+    stored = warehouse.store_report(conn, "a", to_frame([SALE_1, SALE_2, SALE_2]), dedupe=True)
+    assert len(stored) == 3
+
+    stored = warehouse.store_report(conn, "b", to_frame([SALE_2, SALE_2, SALE_3, UNPRICED]), dedupe=True)
+    assert stored["Item Number"].tolist() == ["435-12", "435-13"]
+
+    union = to_frame([SALE_1, SALE_2, SALE_2, SALE_3, UNPRICED])
+    assert stored_hashes(conn) == sorted(warehouse.sale_hashes(union).tolist())
+    assert warehouse.report_deduped(conn, "b") is True
+
+
+@pytest.mark.parametrize("dedupe", [False, True])
+def test_storing_a_report_again_replaces_it(conn, dedupe):
+    report = to_frame([SALE_1, SALE_2, SALE_3])
+    warehouse.store_report(conn, "a", report, dedupe=dedupe)
+    warehouse.store_report(conn, "a", report, dedupe=dedupe)
+
+    assert len(warehouse.load_sales(conn)) == 3
+    assert conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0] == 1
+
+
+def test_storing_replaces_older_keys(conn):
+    report = to_frame([SALE_1, SALE_2])
+    warehouse.store_report(conn, "v1", report)
+    warehouse.store_report(conn, "v2", report, replaces=["v1"])
+
+    assert len(warehouse.load_sales(conn)) == 2
+    assert not warehouse.has_report(conn, "v1")
+
+
+def totals(df):
+    return len(df), int(df["Price Cents"].sum())
+
+
+@pytest.mark.parametrize("dedupe", [False, True])
+def test_replay_preserves_totals(tmp_path, dedupe):
+    rng = random.Random(7)
+    pages = paginate(rng, report_lines(rng, customers=12)[0])
+    later_pages = pages[len(pages) // 2:] + paginate(rng, report_lines(rng, customers=4)[0])
+    paths = [write_pdf(pages, tmp_path / "first.pdf"), write_pdf(later_pages, tmp_path / "later.pdf")]
+    dataset_dir, warehouse_path = tmp_path / "sales", tmp_path / "warehouse.sqlite"
+
+    results = list(ingest_files(paths, dataset_dir, workers=1, warehouse_path=warehouse_path, dedupe=dedupe))
+    assert [error for _, _, error in results] == [None, None]
+
+    reports = [process_pdf(path, use_cache=False) for path in paths]
+    hashes = [warehouse.sale_hashes(df) for df in reports]
+    expected_rows = len(np.union1d(*hashes)) if dedupe else sum(len(df) for df in reports)
+
+    with closing(warehouse.connect(warehouse_path)) as conn:
+        ingested = totals(warehouse.load_sales(conn))
+    assert ingested[0] == expected_rows
+    assert totals(read_dataset(dataset_dir)) == ingested
+
+    replayed = [result for result in replay_reports(dataset_dir, 1, warehouse_path, everything=True)]
+    assert all(error is None for _, _, error in replayed)
+
+    with closing(warehouse.connect(warehouse_path)) as conn:
+        assert totals(warehouse.load_sales(conn)) == ingested
+    assert totals(read_dataset(dataset_dir)) == ingested